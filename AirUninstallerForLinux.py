@@ -7,16 +7,87 @@
 
 import os
 import re
+import bisect
 import shutil
+import stat
 import subprocess
+import fcntl
+import pwd
 import sys
 import glob
-from typing import List, Dict, Union, Tuple
+import fnmatch
+import json
+import hashlib
+import tempfile
+import pathlib
+import time
+import zipfile
+import tarfile
+import lzma
+import zlib
+import xml.etree.ElementTree as ET
+import argparse
+import threading
+import concurrent.futures
+from collections import deque
+from typing import List, Dict, Union, Tuple, Optional, Callable, Iterable
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+# 持久化扫描索引的默认位置
+DEFAULT_INDEX_PATH = '/var/cache/airuninstaller/index.sqlite'
+# 共享遍历的起始目录
+SCAN_ROOTS = [
+    os.path.expanduser('~'),
+    '/opt',
+    '/usr/local'
+]
+# 启动解释器/JVM探测版本时的超时时间(秒)
+PROBE_TIMEOUT = 5
+# 所有版本探测的总时限(秒)
+PROBE_DEADLINE = 60
+# 排队等待探测的版本占位符
+PROBE_PENDING = "待探测"
+# 延迟删除时，安装先改名移入所在文件系统挂载点下的该目录
+TRASH_DIR_NAME = '.airuninstaller-trash'
+# 隔离模式下被移除的安装保存在该目录中，可以恢复
+QUARANTINE_DIR_NAME = '.airuninstaller-quarantine'
+# 隔离区条目的默认保留天数
+QUARANTINE_RETENTION_DAYS = 30
+# 环境文件修改前的备份目录(按内容哈希命名，相同内容只保存一份)
+RC_BACKUP_DIR = '/var/cache/airuninstaller/rc-backups'
+# 归档时每压缩满该大小(未压缩字节)就开始一个新的压缩流，单个文件可以从所在块开始解压
+ARCHIVE_BLOCK_SIZE = 16 * 1024 * 1024
+# alternatives管理数据库目录(Debian系, RHEL系)
+ALTERNATIVES_DIRS = ('/var/lib/dpkg/alternatives', '/var/lib/alternatives')
+# 软件包文件归属索引的缓存(包数据库未变化时直接读取)
+PACKAGE_INDEX_PATH = '/var/cache/airuninstaller/package-index.json.z'
 
 class SystemCleaner:
-    def __init__(self):
+    def __init__(self, options: Optional[argparse.Namespace] = None):
         self.verbose = True
+        self.options = options if options is not None else build_parser().parse_args([])
+        # 验证后仍然存在的路径[{path, owner, state}]
+        self.remaining = []
+        # 本次计划删除的安装，以及其中实际删除(或移入回收目录、隔离区)的安装，由_remove_paths填写
+        self.planned = []
+        self.removed = []
+        # 需要清理环境文件和alternatives的安装：实际删除的安装和隔离期满被删除的条目(隔离中的安装不清理)
+        self.cleanup = []
         self.is_root = self._check_root()
+        self.index = None
+        # 共享遍历的结果({检测器名: 候选路径列表})，None表示尚未遍历
+        self.scan_hits = None
+        # glob模式的展开结果({模式: 路径列表})，None表示尚未展开
+        self.glob_hits = None
+        # alternatives数据库，检测和卸载共用，None表示尚未读取
+        self.alternatives = None
+        # 软件包文件归属索引，None表示尚未读取
+        self.packages = None
+        self.probes = ProbeExecutor(self.options.probe_workers, PROBE_TIMEOUT, self.options.probe_deadline)
     
     def log(self, message: str) -> None:
         """记录日志信息"""
@@ -31,6 +102,455 @@ class SystemCleaner:
         """检查是否以root身份运行"""
         return os.getuid() == 0
     
+    def _open_index(self) -> None:
+        """打开持久化扫描索引，失败时退化为完整扫描"""
+        if self.index is not None or sqlite3 is None or self.options.no_index:
+            return
+        dry_run = self.options.dry_run
+        if dry_run and (self.options.rebuild or not os.path.exists(self.options.index)):
+            # --dry-run不写入磁盘，没有可以只读使用的索引时直接完整扫描
+            return
+        try:
+            self.index = ScanIndex(self.options.index, self.options.rebuild, read_only=dry_run)
+        except Exception as e:
+            self.log(f"打开扫描索引失败 {self.options.index}: {str(e)}，将进行完整扫描")
+
+    def _memo(self, kind: str, path: str, compute: Callable[[str], str]) -> str:
+        """优先使用索引中缓存的检测结果"""
+        if self.index is None:
+            return compute(path)
+        return self.index.memo(kind, path, lambda: compute(path))
+
+    def _user_homes(self) -> List[str]:
+        """所有用户的主目录(当前用户、root、普通用户和/home下的目录)"""
+        homes = {os.path.expanduser('~')}
+        try:
+            for user in pwd.getpwall():
+                if (user.pw_uid == 0 or user.pw_uid >= 1000) and user.pw_dir not in ('', '/'):
+                    homes.add(user.pw_dir)
+        except Exception:
+            pass
+        homes.update(glob.glob('/home/*'))
+        return sorted(home for home in homes if os.path.isdir(home))
+
+    def register_detectors(self, engine: 'ScanEngine') -> None:
+        """向共享遍历引擎注册本卸载器的目录匹配器(由子类实现)"""
+        pass
+
+    def _expand_patterns(self, patterns: List[str]) -> Dict[str, List[str]]:
+        """展开glob模式：共享流程已展开时直接使用，否则为本卸载器编译前缀树展开一次"""
+        if self.glob_hits is None or any(pattern not in self.glob_hits for pattern in patterns):
+            self.glob_hits = PatternTrie(patterns).expand()
+        return self.glob_hits
+
+    def _scan_hits(self, name: str) -> list:
+        """取得某个检测器的遍历结果：已进行过共享遍历时直接使用，否则只为本卸载器遍历一次"""
+        if self.scan_hits is None:
+            engine = ScanEngine(self.options, self.index)
+            self.register_detectors(engine)
+            self.scan_hits = engine.run(SCAN_ROOTS)
+            self._report_scan(engine)
+        return self.scan_hits.get(name, [])
+
+    def _report_scan(self, engine: 'ScanEngine') -> None:
+        """输出共享遍历的耗时(按检测器分别统计)和裁剪情况"""
+        timings = ", ".join(f"{name} {seconds:.2f}秒" for name, seconds in sorted(engine.timings.items()))
+        self.log(f"目录遍历耗时 {engine.elapsed:.2f}秒 (检测器: {timings})")
+        self._report_pruned(engine.rules)
+
+    def _report_memory(self, records: list) -> None:
+        """输出安装记录的内存占用(--mem-stats)"""
+        if not self.options.mem_stats or not records:
+            return
+        slotted, as_dict = Installation.memory_footprint(records)
+        self.log(
+            f"安装记录内存: {len(records)} 条, 每条 {slotted / len(records):.0f} 字节"
+            f" (使用dict时每条 {as_dict / len(records):.0f} 字节)"
+        )
+
+    def _run_probes(self) -> None:
+        """并行执行排队中的版本探测，结果写回安装记录"""
+        if not self.probes.pending:
+            return
+        self.log(f"\n正在探测 {self.probes.pending} 个安装的版本...")
+        for install in self.probes.run():
+            self.log(f"版本: {install['version']} @ {install['path']}")
+
+    def _report_pruned(self, rules: 'PruneRules') -> None:
+        """输出遍历时被裁剪的子树，便于调整裁剪规则"""
+        if not rules.skipped:
+            return
+        summary = ", ".join(f"{reason} {count}" for reason, count in sorted(rules.summary().items()))
+        self.log(f"已跳过 {len(rules.skipped)} 个子树: {summary}")
+        report_file = self.options.prune_report
+        if report_file:
+            try:
+                with open(report_file, 'w') as f:
+                    for path, reason in sorted(rules.skipped):
+                        f.write(f"{reason}\t{path}\n")
+                self.log(f"跳过明细已写入: {report_file}")
+            except Exception as e:
+                self.log(f"写入跳过明细失败 {report_file}: {str(e)}")
+
+    def _verify_removed(self, installs: list) -> List[Dict[str, str]]:
+        """只检查计划删除的路径及其别名(每个路径一次lstat)，返回仍然存在的项
+
+        指向已删除目标的别名链接(如/opt/jdk -> jdk-17.0.2)已经悬空，不算删除失败。
+        """
+        remaining = []
+        for install in installs:
+            for path in (install['path'], *install.get('aliases', ())):
+                try:
+                    st = os.lstat(path)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    remaining.append({'path': path, 'owner': install['path'], 'state': f"无法访问({e.strerror})"})
+                    continue
+                if stat.S_ISLNK(st.st_mode):
+                    if not os.path.exists(path) and path != install['path']:
+                        continue
+                    state = '符号链接' if os.path.exists(path) else '悬空链接'
+                elif stat.S_ISDIR(st.st_mode):
+                    state = '目录'
+                else:
+                    state = '文件'
+                remaining.append({'path': path, 'owner': install['path'], 'state': state})
+        return remaining
+
+    def _report_remaining(self) -> None:
+        """输出验证后仍然存在的路径"""
+        for item in self.remaining:
+            owner = f" (属于 {item['owner']})" if item['owner'] != item['path'] else ''
+            self.log(f"- {item['state']} @ {item['path']}{owner}")
+
+    def _kept_installs(self) -> list:
+        """计划删除却被保留(归档或隔离失败、属于软件包)、仍在磁盘上的安装"""
+        removed = {install['path'] for install in self.removed}
+        return [install for install in self.planned
+                if install['path'] not in removed and os.path.lexists(install['path'])]
+
+    def _verify_planned(self, name: str) -> bool:
+        """对照计划验证：复查实际删除的路径，并单独列出被保留的安装；两者都没有时才算成功"""
+        self.remaining = self._verify_removed(self.removed)
+        kept = self._kept_installs()
+        if not self.remaining and not kept:
+            self.log(f"所有{name}安装已成功移除")
+            return True
+
+        if kept:
+            self.log(f"\n警告: 以下{name}安装计划删除但被保留，仍在磁盘上:")
+            for install in kept:
+                self.log(f"- {install['path']}")
+        if self.remaining:
+            self.log(f"\n以下{name}安装路径未被完全移除:")
+            self._report_remaining()
+        return False
+
+    def _remove_paths(self, installs: list) -> list:
+        """用并行删除引擎删除各安装，逐项输出结果和失败的文件
+
+        返回实际处理过的安装(已删除或删除未完成的、移入回收目录或隔离区的，包括随上级目录一起删除的)；
+        归档失败、无法隔离或属于软件包而被保留的安装不在其中，后续的环境变量和alternatives清理只针对返回的安装，
+        验证时被保留的安装单独列出。
+
+        --defer模式下先把安装改名移入回收目录，由后台低优先级进程完成删除；
+        无法在同一文件系统内改名的安装仍立即删除。
+        --quarantine模式下安装移入隔离区，可以用restore命令恢复；隔离中的安装不计入self.cleanup，
+        环境文件和alternatives中指向它们的条目保留到条目过期删除时再清理，恢复后无需重新配置。
+        指定--archive时先归档，归档失败的安装不会被删除。
+        每次删除前都会清理超过保留期限的隔离区条目。
+        属于软件包的路径一律不删除，只提示对应的软件包。
+        """
+        self.planned = list(installs)
+        plan = RemovalPlan(self._skip_packaged(installs))
+        collapsed, saved_bytes = plan.saved()
+        if collapsed:
+            self.log(
+                f"删除计划已优化: {len(installs)} 项合并为 {len(plan.operations)} 项"
+                f"(重复 {plan.duplicates} 项，包含在上级目录中 {collapsed - plan.duplicates} 项，"
+                f"省去约 {self.format_size(saved_bytes)} 的重复遍历)"
+            )
+            for path, group in plan.covered.items():
+                for install in group:
+                    self.log(f"  - {install['path']} 随 {path} 一起删除")
+        installs = sorted(plan.operations, key=plan.weight, reverse=True)
+
+        if self.options.archive:
+            installs = self._archive_installs(installs)
+
+        engine = RemovalEngine(self.options.rm_workers)
+        store = QuarantineStore(self.options.retention_days)
+        self.cleanup = self._expire_quarantine(store, engine)
+        handled = []
+        if self.options.quarantine:
+            for install in installs:
+                group = (install, *plan.covered[install['path']])
+                manifest = store.quarantine(install, engine, [alias for covered in group for alias in covered['aliases']])
+                if manifest is None:
+                    self.log(f"无法隔离，已保留: {install['path']} (不能在同一文件系统内移动，也不支持reflink)")
+                    continue
+                handled.append(install)
+                self.log(f"已移入隔离区({manifest['method']}): {install['path']} -> {manifest['id']}")
+            if handled:
+                self.log("隔离中的安装可以恢复，指向它们的别名链接、环境变量和alternatives条目保留到隔离期满后清理")
+            return [covered for install in handled for covered in (install, *plan.covered[install['path']])]
+
+        if self.options.defer:
+            trash = TrashStore()
+            immediate = []
+            for install in installs:
+                target = trash.stash(install['path'])
+                if target is None:
+                    immediate.append(install)
+                    continue
+                handled.append(install)
+                self.log(f"已移入回收目录: {install['path']} -> {target}")
+            if len(immediate) < len(installs):
+                try:
+                    TrashStore.spawn_purge()
+                    self.log("后台清理已启动(低I/O优先级)，也可以稍后运行 purge 命令")
+                except OSError as e:
+                    self.log(f"启动后台清理失败: {str(e)}，请稍后运行 purge 命令")
+            installs = immediate
+
+        reports = engine.remove([(install['path'], plan.weight(install)) for install in installs])
+        for path, report in reports.items():
+            if not report['failures']:
+                if report['files'] or report['dirs']:
+                    self.log(f"已删除: {path} ({report['files']} 个文件, {report['dirs']} 个目录)")
+                continue
+            self.log(f"删除未完成 {path}: {len(report['failures'])} 项失败")
+            for failed, reason in report['failures']:
+                self.log(f"  - {failed}: {reason}")
+        handled.extend(installs)
+        removed = [covered for install in handled for covered in (install, *plan.covered[install['path']])]
+        self._unlink_dangling_aliases(removed)
+        self.cleanup.extend(removed)
+        return removed
+
+    def _expire_quarantine(self, store: 'QuarantineStore', engine: 'RemovalEngine') -> list:
+        """删除过期的隔离区条目，返回需要补做环境文件和alternatives清理的记录[{path, aliases}]
+
+        原路径在隔离期间被重新安装时不再清理，以免误删新安装的配置。
+        """
+        expired = []
+        for manifest in store.expire(engine):
+            self.log(f"隔离区条目已过期并删除: {manifest['id']} ({manifest['original']})")
+            if os.path.lexists(manifest['original']):
+                self.log(f"  原路径已有新的安装，保留相关配置: {manifest['original']}")
+                continue
+            expired.append({'path': manifest['original'], 'aliases': tuple(manifest.get('aliases', ()))})
+        self._unlink_dangling_aliases(expired)
+        return expired
+
+    def _unlink_dangling_aliases(self, installs: list) -> None:
+        """目标删除后，指向它的别名符号链接(如/opt/jdk -> jdk-17.0.2)已经悬空，一并删除
+
+        目标仍然存在(删除失败或被保留)的链接不会悬空，因此不受影响；属于软件包的链接交给包管理器。
+        """
+        index = self._package_index()
+        for install in installs:
+            for alias in install['aliases']:
+                if not os.path.islink(alias) or os.path.exists(alias) or index.owner(alias):
+                    continue
+                try:
+                    os.unlink(alias)
+                    self.log(f"已删除悬空链接: {alias}")
+                except OSError as e:
+                    self.log(f"删除链接失败 {alias}: {str(e)}")
+
+    def _archive_installs(self, installs: list) -> list:
+        """删除前把各安装并行压缩归档到--archive目录，返回归档成功的安装"""
+        fmt = self.options.archive_format
+        try:
+            os.makedirs(self.options.archive, exist_ok=True)
+        except OSError as e:
+            self.log(f"创建归档目录失败 {self.options.archive}: {str(e)}，不删除任何安装")
+            return []
+
+        stamp = time.strftime('%Y%m%d%H%M%S')
+        jobs = {}
+        for install in installs:
+            # 已不存在的安装无需归档
+            if not os.path.lexists(install['path']):
+                continue
+            name = f"{stamp}-{os.path.basename(install['path'].rstrip('/'))}"
+            archive = os.path.join(self.options.archive, name + BlockArchiver.SUFFIXES[fmt])
+            suffix = 1
+            while os.path.lexists(archive) or archive in jobs.values():
+                archive = os.path.join(self.options.archive, f"{name}.{suffix}{BlockArchiver.SUFFIXES[fmt]}")
+                suffix += 1
+            jobs[install['path']] = archive
+
+        self.log(f"\n正在归档 {len(jobs)} 个安装到 {self.options.archive} ...")
+        archived = set()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.options.archive_workers) as pool:
+            futures = [pool.submit(_archive_installation, path, archive, fmt) for path, archive in jobs.items()]
+            for future in concurrent.futures.as_completed(futures):
+                source, archive, count, error = future.result()
+                if archive is None:
+                    self.log(f"归档失败，已保留 {source}: {error}")
+                    continue
+                archived.add(source)
+                self.log(f"已归档: {source} -> {archive} ({count} 项)")
+        return [install for install in installs if install['path'] in archived or install['path'] not in jobs]
+
+    def measure_plan(self, installs: list) -> Tuple[int, int]:
+        """统计计划删除的各安装的可释放空间，写入install['size']，返回(可释放总量, 按链接累加的总量)"""
+        sizes, reclaimable, apparent = DiskUsage(self.options.workers).measure([install['path'] for install in installs])
+        for install in installs:
+            install['size'] = sizes.get(install['path'], 0)
+        return reclaimable, apparent
+
+    @staticmethod
+    def format_size(size: int) -> str:
+        """把字节数格式化为便于阅读的大小"""
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024:
+                return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} TB"
+
+    @staticmethod
+    def _removed_paths(installs: list) -> 'RemovedPaths':
+        """计划删除的安装路径及其别名"""
+        return RemovedPaths([path for install in installs for path in (install['path'], *install['aliases'])])
+
+    def _alternatives_db(self) -> 'AlternativesDB':
+        """读取一次alternatives数据库，检测和卸载阶段共用"""
+        if self.alternatives is None:
+            self.alternatives = AlternativesDB()
+        return self.alternatives
+
+    def _package_index(self) -> 'PackageIndex':
+        """读取一次软件包文件归属索引(包数据库未变化时使用缓存)"""
+        if self.packages is None:
+            started = time.monotonic()
+            self.packages = PackageIndex(write_cache=not self.options.dry_run)
+            if self.packages.available:
+                origin = "缓存" if self.packages.cached else "包数据库"
+                self.log(f"软件包归属索引: {len(self.packages)} 个路径，读取自{origin} "
+                         f"({time.monotonic() - started:.2f} 秒)")
+        return self.packages
+
+    def _skip_packaged(self, installs: list) -> list:
+        """拒绝删除属于软件包的安装(或其中含有软件包文件的目录)，返回其余的安装"""
+        index = self._package_index()
+        kept = []
+        for install in installs:
+            package = index.package_of(install)
+            if package:
+                self.log(f"拒绝删除 {install['path']}: 属于软件包 {package}，请使用 {index.removal_hint(package)} 卸载")
+                continue
+            kept.append(install)
+        return kept
+
+    def _package_owner(self, path: str) -> str:
+        """安装目录本身或其中的文件所属的软件包"""
+        index = self._package_index()
+        return index.owner(path) or index.owned_under(path) or ''
+
+    def _package_advice(self, install) -> str:
+        """跳过系统安装时给出的卸载建议"""
+        if install['package']:
+            return f"属于软件包 {install['package']}，请使用 {self._package_index().removal_hint(install['package'])} 卸载"
+        return "请使用系统包管理器卸载"
+
+    def _remove_alternatives(self, installs: list) -> None:
+        """一次性找出指向installs的所有alternatives链接组并批量移除"""
+        db = self._alternatives_db()
+        if db.admin_dir is None:
+            self.log("未找到alternatives数据库，跳过")
+            return
+        plan = db.plan(self._removed_paths(installs))
+        if not plan:
+            self.log(f"检查 {len(db.groups)} 个链接组，没有指向已删除安装的条目")
+            return
+        for name, error in db.apply(plan):
+            if error:
+                self.log(f"更新alternatives失败 {name}: {error}")
+            else:
+                self.log(f"已从alternatives中移除: {name}")
+        whole = sum(1 for _, _, everything in plan if everything)
+        self.log(f"检查 {len(db.groups)} 个链接组，整组移除 {whole} 个，移除部分条目 {len(plan) - whole} 个")
+
+    # 各用户主目录下需要清理的环境文件(相对路径，支持glob)
+    HOME_ENV_FILES = [
+        '.bashrc', '.bash_profile', '.bash_login', '.profile',
+        '.zshrc', '.zprofile', '.zshenv',
+        '.config/fish/config.fish', '.config/fish/conf.d/*.fish',
+        '.config/environment.d/*.conf'
+    ]
+    # 系统级环境文件
+    SYSTEM_ENV_FILES = ['/etc/environment', '/etc/profile.d/*.sh']
+
+    def _env_targets(self) -> List[Tuple[str, Optional[str], str]]:
+        """一次列出所有用户和系统的环境文件，返回[(所属用户, 主目录, 路径)]，同一真实文件只出现一次"""
+        targets = []
+        seen = set()
+
+        def add(owner: str, home: Optional[str], pattern: str) -> None:
+            for path in sorted(glob.glob(pattern)):
+                real = os.path.realpath(path)
+                if real not in seen and os.path.isfile(real):
+                    seen.add(real)
+                    targets.append((owner, home, path))
+
+        for pattern in self.SYSTEM_ENV_FILES:
+            add('系统', None, pattern)
+        for home in self._user_homes():
+            try:
+                owner = pwd.getpwuid(os.stat(home).st_uid).pw_name
+            except (KeyError, OSError):
+                owner = os.path.basename(home)
+            for rel in self.HOME_ENV_FILES:
+                add(owner, home, os.path.join(glob.escape(home), rel))
+        return targets
+
+    def _rewrite_env_files(self, installs: list) -> None:
+        """在线程池中用共享的改写器清理所有用户的环境文件中指向installs的内容，按用户汇总输出"""
+        if not installs:
+            self.log("没有被删除的安装，无需修改环境文件")
+            return
+        rewriter = RcRewriter()
+        matcher = RcMatcher(self._removed_paths(installs))
+        targets = self._env_targets()
+
+        def clean(target: Tuple[str, Optional[str], str]) -> Tuple[str, str, int, Optional[str], str]:
+            owner, home, path = target
+            try:
+                removed, backup = rewriter.rewrite(path, matcher, home)
+                return owner, path, removed, backup, ''
+            except Exception as e:
+                return owner, path, 0, None, str(e)
+
+        # {用户: [文件数, 删除的行数, [(修改的文件, 备份)], [(失败的文件, 原因)]]}
+        summary = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.options.workers) as pool:
+            for owner, path, removed, backup, error in pool.map(clean, targets):
+                stats = summary.setdefault(owner, [0, 0, [], []])
+                stats[0] += 1
+                if removed:
+                    stats[1] += removed
+                    stats[2].append((path, backup))
+                if error:
+                    stats[3].append((path, error))
+
+        unchanged = 0
+        for owner, (files, lines, changed, failures) in sorted(summary.items()):
+            if not changed and not failures:
+                unchanged += 1
+                continue
+            self.log(f"{owner}: 检查 {files} 个文件，修改 {len(changed)} 个，删除或修改 {lines} 行")
+            for path, backup in changed:
+                self.log(f"  已修改 {path}，原文件备份: {backup}")
+            for path, error in failures:
+                self.log(f"  清理失败 {path}: {error}")
+        self.log(f"共检查 {len(targets)} 个环境文件({len(summary)} 个用户)，{unchanged} 个用户无需修改")
+        if any(stats[2] for stats in summary.values()):
+            self.log(f"备份与原文件的对应关系见: {rewriter.manifest_path()}")
+
     def _ensure_root(self) -> None:
         """确保以root身份运行"""
         if not self.is_root:
@@ -38,88 +558,2794 @@ class SystemCleaner:
             self.log("建议命令: sudo python3 " + " ".join(sys.argv))
             sys.exit(1)
 
+class PruneRules:
+    """目录遍历裁剪规则：目录名/路径黑名单、特殊文件系统、最大深度和单文件系统模式"""
+
+    # 不可能包含Python/Java安装的目录名
+    DEFAULT_NAMES = frozenset({
+        'node_modules', '.git', '.hg', '.svn', '__pycache__',
+        '.mypy_cache', '.pytest_cache', '.ruff_cache',
+        '.npm', '.yarn', '.cargo', '.rustup', 'overlay2', TRASH_DIR_NAME,
+        QUARANTINE_DIR_NAME
+    })
+    DEFAULT_PATHS = (
+        '/proc', '/sys', '/dev', '/run', '/snap',
+        '/var/lib/docker', '/var/lib/containerd', '/var/lib/containers'
+    )
+    # 伪文件系统和网络文件系统的挂载点整体跳过
+    SKIP_FSTYPES = frozenset({
+        'proc', 'sysfs', 'devtmpfs', 'devpts', 'cgroup', 'cgroup2', 'debugfs',
+        'tracefs', 'securityfs', 'pstore', 'bpf', 'autofs', 'mqueue', 'hugetlbfs',
+        'fusectl', 'configfs', 'binfmt_misc', 'overlay', 'squashfs',
+        'nfs', 'nfs4', 'cifs', 'smb3', 'fuse.sshfs'
+    })
+    # 由工具链管理器检测器直接读取的目录(相对用户主目录)，遍历时不再进入
+    MANAGER_DIRS = (
+        '.pyenv', '.asdf', '.local/share/uv', '.local/share/mise', '.local/share/pipx', '.local/pipx',
+        '.sdkman', '.jenv', '.gradle/jdks'
+    )
+
+    def __init__(self, max_depth: Optional[int] = None, one_filesystem: bool = False):
+        self.names = set(self.DEFAULT_NAMES)
+        self.paths = {path: '路径黑名单' for path in self.DEFAULT_PATHS}
+        self.paths.update(self._special_mounts())
+        for home in {os.path.expanduser('~'), *glob.glob('/home/*')}:
+            for rel in self.MANAGER_DIRS:
+                self.paths[os.path.join(home, rel)] = '工具链管理器目录'
+        self.max_depth = max_depth
+        self.one_filesystem = one_filesystem
+        self.skipped = []
+        self._lock = threading.Lock()
+
+    def _special_mounts(self) -> Dict[str, str]:
+        """从/proc/self/mounts读取需要跳过的挂载点"""
+        mounts = {}
+        try:
+            with open('/proc/self/mounts', 'r') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 3 or fields[2] not in self.SKIP_FSTYPES:
+                        continue
+                    # 挂载点中的空格等字符以八进制转义
+                    mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[1])
+                    mounts[mount_point] = f"特殊文件系统({fields[2]})"
+        except OSError:
+            pass
+        return mounts
+
+    def check(self, entry: os.DirEntry, depth: int, root_dev: Optional[int]) -> Optional[str]:
+        """判断是否跳过该子目录，返回跳过原因，None表示继续遍历"""
+        if entry.name in self.names:
+            return '目录名黑名单'
+        reason = self.paths.get(entry.path)
+        if reason:
+            return reason
+        if self.max_depth is not None and depth > self.max_depth:
+            return '超过最大深度'
+        if self.one_filesystem and root_dev is not None:
+            try:
+                if entry.stat(follow_symlinks=False).st_dev != root_dev:
+                    return '跨文件系统'
+            except OSError:
+                return '无法访问'
+        return None
+
+    def skip(self, path: str, reason: str) -> None:
+        """记录被跳过的子树"""
+        with self._lock:
+            self.skipped.append((path, reason))
+
+    def summary(self) -> Dict[str, int]:
+        """按原因统计被跳过的子树数量"""
+        counts = {}
+        for _, reason in self.skipped:
+            counts[reason] = counts.get(reason, 0) + 1
+        return counts
+
+class IndexedEntry:
+    """索引中记录的子目录，提供与os.DirEntry相同的常用接口"""
+    __slots__ = ('name', 'path')
+
+    def __init__(self, parent: str, name: str):
+        self.name = name
+        self.path = os.path.join(parent, name)
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return True
+
+    def is_symlink(self) -> bool:
+        return False
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        return os.stat(self.path, follow_symlinks=follow_symlinks)
+
+class ScanIndex:
+    """持久化扫描索引(SQLite)
+
+    dirs表记录每个目录的mtime、子目录和命中结果，重新扫描时mtime未变化的目录不再列出；
+    results表按文件签名缓存版本号等检测结果。
+    read_only时以只读方式打开已有的索引(--dry-run)，本次扫描的变更只保留在内存中，commit不写入磁盘。
+    """
+
+    def __init__(self, path: str, rebuild: bool = False, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._results = None
+        self._pending_dirs = []
+        self._pending_forget = []
+        self._pending_results = []
+        if read_only:
+            self._conn = sqlite3.connect(f"{pathlib.Path(os.path.abspath(path)).as_uri()}?mode=ro",
+                                         uri=True, check_same_thread=False)
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dirs ("
+                "scope TEXT, path TEXT, mtime INTEGER, subdirs TEXT, hits TEXT, "
+                "PRIMARY KEY (scope, path))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "kind TEXT, path TEXT, signature TEXT, value TEXT, "
+                "PRIMARY KEY (kind, path))"
+            )
+            if rebuild:
+                self._conn.execute("DELETE FROM dirs")
+                self._conn.execute("DELETE FROM results")
+
+    def load_dirs(self, scope: str) -> Dict[str, tuple]:
+        """读取某类扫描的全部目录记录: {path: (mtime, 子目录名列表, 命中结果列表)}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, mtime, subdirs, hits FROM dirs WHERE scope = ?", (scope,)
+            ).fetchall()
+        return {
+            path: (mtime, json.loads(subdirs), [tuple(hit) if isinstance(hit, list) else hit for hit in json.loads(hits)])
+            for path, mtime, subdirs, hits in rows
+        }
+
+    def record(self, scope: str, path: str, mtime: int, subdirs: List[str], hits: list,
+               old_subdirs: Optional[List[str]] = None) -> None:
+        """记录目录的扫描结果，已消失的子目录连同其子树一并从索引中删除"""
+        with self._lock:
+            self._pending_dirs.append((scope, path, mtime, json.dumps(subdirs), json.dumps(hits)))
+            if old_subdirs:
+                for name in set(old_subdirs) - set(subdirs):
+                    self._pending_forget.append((scope, os.path.join(path, name)))
+
+    def memo(self, kind: str, path: str, compute: Callable[[], object]) -> object:
+        """按文件签名(inode/大小/mtime)缓存计算结果，文件未变化时直接返回上次的结果
+
+        compute抛出异常(如ProbeError)时不缓存，下次扫描重新计算。
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return compute()
+        signature = f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+        with self._lock:
+            if self._results is None:
+                rows = self._conn.execute("SELECT kind, path, signature, value FROM results").fetchall()
+                self._results = {(k, p): (sig, json.loads(value)) for k, p, sig, value in rows}
+            cached = self._results.get((kind, path))
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        value = compute()
+        with self._lock:
+            self._results[(kind, path)] = (signature, value)
+            self._pending_results.append((kind, path, signature, json.dumps(value)))
+        return value
+
+    def commit(self) -> None:
+        """将本次扫描的变更写入磁盘(只读时丢弃)"""
+        with self._lock:
+            dirs, self._pending_dirs = self._pending_dirs, []
+            forget, self._pending_forget = self._pending_forget, []
+            results, self._pending_results = self._pending_results, []
+            if self.read_only:
+                return
+            with self._conn:
+                for scope, path in forget:
+                    self._conn.execute(
+                        "DELETE FROM dirs WHERE scope = ? AND (path = ? OR substr(path, 1, ?) = ?)",
+                        (scope, path, len(path) + 1, path + '/')
+                    )
+                self._conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?)", dirs)
+                self._conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", results)
+
+class ParallelWalker:
+    """基于os.scandir的多线程目录遍历器(work-stealing)"""
+
+    def __init__(self, workers: Optional[int] = None, rules: Optional[PruneRules] = None,
+                 index: Optional[ScanIndex] = None):
+        # 与ThreadPoolExecutor的默认线程数保持一致
+        self.workers = max(1, workers or min(32, (os.cpu_count() or 1) + 4))
+        self.rules = rules
+        self.index = index
+        self._scope = None
+        self._cache = {}
+
+    def walk(self, roots: List[str], visit: Callable[[str, list, list], Optional[list]],
+             scope: Optional[str] = None) -> list:
+        """并行遍历roots下所有目录
+
+        每个目录调用一次visit(root, dirs, files)，dirs和files为os.DirEntry列表。
+        与os.walk一样，visit可以原地修改dirs来跳过子目录；返回的元素会被汇总返回。
+        设置了rules时，被裁剪的子目录不会进入，并记录在rules.skipped中。
+        设置了index时，scope标识visit的种类，mtime未变化的目录直接沿用索引中的结果。
+        """
+        self._scope = scope if self.index is not None else None
+        self._cache = self.index.load_dirs(scope) if self._scope else {}
+
+        # 每个线程一个双端队列：自己从右端取(深度优先)，空闲时从其他线程左端窃取
+        queues = [deque() for _ in range(self.workers)]
+        results = [[] for _ in range(self.workers)]
+        errors = []
+        cond = threading.Condition()
+        pending = [len(roots)]
+
+        for i, root in enumerate(roots):
+            queues[i % self.workers].append((root, 0, self._root_dev(root)))
+
+        threads = [
+            threading.Thread(target=self._worker, args=(i, queues, results[i], errors, cond, pending, visit), daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        return [item for chunk in results for item in chunk]
+
+    def _worker(self, index: int, queues: list, sink: list, errors: list,
+                cond: threading.Condition, pending: list, visit: Callable) -> None:
+        """工作线程：处理自己的队列，队列为空时窃取其他线程的任务"""
+        own = queues[index]
+        while True:
+            item = self._take(index, queues)
+            if item is None:
+                with cond:
+                    if pending[0] == 0:
+                        return
+                    cond.wait(0.05)
+                continue
+
+            try:
+                subdirs = self._scan(item, visit, sink)
+                if subdirs:
+                    # 先计数再入队，避免其他线程误判遍历已结束
+                    with cond:
+                        pending[0] += len(subdirs)
+                        own.extend(subdirs)
+                        cond.notify(len(subdirs))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                with cond:
+                    pending[0] -= 1
+                    if pending[0] == 0:
+                        cond.notify_all()
+
+    def _take(self, index: int, queues: list) -> Optional[tuple]:
+        """从自己的队列取任务，失败则从其他队列窃取"""
+        try:
+            return queues[index].pop()
+        except IndexError:
+            pass
+        for offset in range(1, len(queues)):
+            try:
+                return queues[(index + offset) % len(queues)].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _root_dev(self, root: str) -> Optional[int]:
+        """单文件系统模式下记录起始目录所在的设备号"""
+        if not (self.rules and self.rules.one_filesystem):
+            return None
+        try:
+            return os.stat(root).st_dev
+        except OSError:
+            return None
+
+    def _scan(self, item: tuple, visit: Callable, sink: list) -> List[tuple]:
+        """列出单个目录并调用visit，返回需要继续遍历的子目录"""
+        path, depth, root_dev = item
+        cached = None
+        if self._scope:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                return []
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                # 目录项未变化：沿用索引中的子目录和命中结果，省去scandir
+                sink.extend(cached[2])
+                return self._descend([IndexedEntry(path, name) for name in cached[1]], depth, root_dev)
+
+        dirs, files = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    # DirEntry自带类型信息，无需额外stat
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    (dirs if is_dir else files).append(entry)
+        except OSError:
+            return []
+
+        found = visit(path, dirs, files)
+        if found:
+            sink.extend(found)
+        if self._scope:
+            self.index.record(
+                self._scope, path, mtime,
+                [entry.name for entry in dirs if not entry.is_symlink()],
+                found or [], cached[1] if cached else None
+            )
+        return self._descend(dirs, depth, root_dev)
+
+    def _descend(self, dirs: list, depth: int, root_dev: Optional[int]) -> List[tuple]:
+        """对子目录应用裁剪规则，返回需要继续遍历的子目录"""
+        # 与os.walk默认行为一致：不进入指向目录的符号链接
+        subdirs = []
+        for entry in dirs:
+            if entry.is_symlink():
+                continue
+            reason = self.rules.check(entry, depth + 1, root_dev) if self.rules else None
+            if reason:
+                self.rules.skip(entry.path, reason)
+            else:
+                subdirs.append((entry.path, depth + 1, root_dev))
+        return subdirs
+
+class PatternTrie:
+    """把多条glob模式编译为前缀树，一次遍历展开全部模式
+
+    各模式共享的目录层级只列出一次(例如/home和每个/home/*)，
+    展开结果(包括顺序)与逐条调用glob.glob相同。
+    """
+
+    def __init__(self, patterns: List[str]):
+        # 去重并保持顺序
+        self.patterns = list(dict.fromkeys(patterns))
+        self._root = self._new_node()
+        for pattern in self.patterns:
+            node = self._root
+            for segment in filter(None, pattern.split('/')):
+                node = node['children'].setdefault(segment, self._new_node(segment))
+            node['ends'].append(pattern)
+        self._listings = {}
+
+    def _new_node(self, segment: str = '') -> dict:
+        magic = glob.has_magic(segment)
+        return {
+            'children': {},
+            'ends': [],
+            'magic': magic,
+            'match': re.compile(fnmatch.translate(segment)).match if magic else None,
+            # 与glob一致：不以.开头的通配段不匹配隐藏文件
+            'hidden': segment.startswith('.')
+        }
+
+    def expand(self) -> Dict[str, List[str]]:
+        """返回{模式: 匹配路径列表}"""
+        results = {pattern: [] for pattern in self.patterns}
+        self._listings = {}
+        self._expand(self._root, '/', results)
+        return results
+
+    def _list(self, path: str) -> List[Tuple[str, bool]]:
+        """列出目录(每个目录只scandir一次)，返回[(名称, 是否目录)]"""
+        listing = self._listings.get(path)
+        if listing is None:
+            listing = []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        try:
+                            listing.append((entry.name, entry.is_dir()))
+                        except OSError:
+                            pass
+            except OSError:
+                pass
+            self._listings[path] = listing
+        return listing
+
+    def _expand(self, node: dict, path: str, results: Dict[str, List[str]]) -> None:
+        for segment, child in node['children'].items():
+            if child['magic']:
+                for name, is_dir in self._list(path):
+                    if (name.startswith('.') and not child['hidden']) or not child['match'](name):
+                        continue
+                    self._emit(child, os.path.join(path, name), is_dir, results)
+            else:
+                full_path = os.path.join(path, segment)
+                if os.path.lexists(full_path):
+                    self._emit(child, full_path, True, results)
+
+    def _emit(self, node: dict, path: str, is_dir: bool, results: Dict[str, List[str]]) -> None:
+        """记录匹配到的路径，并继续展开更深的模式段"""
+        for pattern in node['ends']:
+            results[pattern].append(path)
+        # 通配段作为中间层时只匹配目录(与glob的dironly一致)
+        if node['children'] and is_dir:
+            self._expand(node, path, results)
+
+class ScanEngine:
+    """共享遍历引擎
+
+    各卸载器以检测器的形式注册目录匹配器，一次遍历即可得到所有检测器的结果。
+    每个检测器对每个目录恰好调用一次，并分别统计各检测器的耗时。
+    """
+
+    def __init__(self, options: argparse.Namespace, index: Optional[ScanIndex] = None):
+        self.options = options
+        self.index = index
+        self.detectors = []
+        self.rules = None
+        self.timings = {}
+        self.elapsed = 0.0
+        self._local = threading.local()
+        self._accumulators = []
+        self._lock = threading.Lock()
+
+    def register(self, name: str, visit: Callable[[str, list, list], Optional[list]]) -> None:
+        """注册检测器；visit与ParallelWalker的visit约定相同"""
+        self.detectors.append((name, visit))
+
+    def run(self, roots: List[str]) -> Dict[str, list]:
+        """遍历roots，返回{检测器名: 候选列表}"""
+        self.rules = PruneRules(self.options.max_depth, self.options.one_filesystem)
+        walker = ParallelWalker(self.options.workers, self.rules, self.index)
+        # 索引中缓存的命中结果与检测器组合相关
+        scope = 'engine:' + '+'.join(sorted(name for name, _ in self.detectors))
+
+        start = time.perf_counter()
+        hits = walker.walk(roots, self._visit, scope)
+        self.elapsed = time.perf_counter() - start
+
+        self.timings = {name: 0.0 for name, _ in self.detectors}
+        for accumulator in self._accumulators:
+            for name, seconds in accumulator.items():
+                self.timings[name] += seconds
+
+        results = {name: [] for name, _ in self.detectors}
+        for name, hit in hits:
+            results[name].append(hit)
+        for name in results:
+            results[name] = sorted(set(results[name]))
+        return results
+
+    def _visit(self, root: str, dirs: list, files: list) -> list:
+        """依次调用各检测器；任一检测器裁剪掉的子目录(已识别的安装内部)不再进入"""
+        timings = getattr(self._local, 'timings', None)
+        if timings is None:
+            timings = self._local.timings = {}
+            with self._lock:
+                self._accumulators.append(timings)
+
+        found = []
+        keep = None
+        for name, visit in self.detectors:
+            view = list(dirs)
+            start = time.perf_counter()
+            hits = visit(root, view, files)
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+            if hits:
+                found.extend((name, hit) for hit in hits)
+            if len(view) != len(dirs):
+                names = {entry.name for entry in view}
+                keep = names if keep is None else keep & names
+        if keep is not None:
+            dirs[:] = [entry for entry in dirs if entry.name in keep]
+        return found
+
+class ProbeError(Exception):
+    """版本探测失败；消息直接作为版本显示，结果不写入扫描索引"""
+
+class ProbeExecutor:
+    """有界并发的版本探测执行器
+
+    需要启动进程才能确定版本的候选先排队，扫描结束后在有界线程池中并行执行，
+    每个探测受单次超时限制，全部探测受总时限限制，结果写回对应的安装记录。
+    """
+
+    def __init__(self, workers: Optional[int] = None, timeout: float = PROBE_TIMEOUT,
+                 deadline: float = PROBE_DEADLINE):
+        # 默认并发数较小，避免在生产机器上同时启动过多JVM/解释器
+        self.workers = max(1, workers or min(4, os.cpu_count() or 1))
+        self.timeout = timeout
+        self.deadline = deadline
+        self._jobs = []
+
+    @property
+    def pending(self) -> int:
+        return len(self._jobs)
+
+    def submit(self, record: dict, field: str, probe: Callable[[], str]) -> None:
+        """排队一个探测，完成后结果写入record[field]"""
+        self._jobs.append((record, field, probe))
+
+    def run(self) -> List[dict]:
+        """执行所有排队的探测，返回已更新的记录"""
+        jobs, self._jobs = self._jobs, []
+        if not jobs:
+            return []
+
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        futures = {pool.submit(probe): (record, field) for record, field, probe in jobs}
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=self.deadline):
+                record, field = futures[future]
+                try:
+                    record[field] = future.result()
+                except ProbeError as e:
+                    record[field] = str(e)
+                except Exception as e:
+                    record[field] = f"版本获取失败: {str(e)}"
+        except concurrent.futures.TimeoutError:
+            for future, (record, field) in futures.items():
+                if not future.done():
+                    record[field] = f"版本探测超时(总时限{self.deadline}秒)"
+        finally:
+            # 未开始的探测直接取消；已启动的进程受单次超时限制，不在此等待
+            pool.shutdown(wait=False, cancel_futures=True)
+        return [record for record, _, _ in jobs]
+
+class PythonVersionResolver:
+    """不启动解释器，从pyvenv.cfg、conda-meta、头文件和lib目录推断Python版本"""
+
+    ELF_MAGIC = b'\x7fELF'
+    _NAME_RE = re.compile(r'^python(\d+\.\d+)')
+    _LIB_RE = re.compile(r'^python(\d+\.\d+)$')
+    _CFG_RE = re.compile(r'^\s*(?:version|version_info)\s*=\s*(\d+\.\d+(?:\.\d+)?)', re.M)
+    _CONDA_RE = re.compile(r'^python-(\d+\.\d+(?:\.\d+)?)-.*\.json$')
+    _PATCHLEVEL_RE = re.compile(r'#define\s+PY_VERSION\s+"([^"]+)"')
+
+    @classmethod
+    def is_interpreter(cls, path: str) -> bool:
+        """只接受ELF可执行文件，python3-config、pyenv shim等脚本直接排除"""
+        try:
+            with open(path, 'rb') as f:
+                return f.read(4) == cls.ELF_MAGIC
+        except OSError:
+            return False
+
+    def resolve(self, executable: str) -> Optional[str]:
+        """返回版本号(如3.11.2或3.11)，无法从元数据确定时返回None"""
+        real = os.path.realpath(executable)
+        # 先看可执行文件所在的前缀(虚拟环境)，再看解析符号链接后的真实前缀
+        prefixes = [os.path.dirname(os.path.dirname(executable))]
+        real_prefix = os.path.dirname(os.path.dirname(real))
+        if real_prefix not in prefixes:
+            prefixes.append(real_prefix)
+
+        for name in (os.path.basename(executable), os.path.basename(real)):
+            match = self._NAME_RE.match(name)
+            if match:
+                hint = match.group(1)
+                break
+        else:
+            hint = None
+
+        for prefix in prefixes:
+            version = self._from_pyvenv_cfg(prefix) or self._from_conda_meta(prefix)
+            if version:
+                return version
+        for prefix in prefixes:
+            version = self._from_layout(prefix, hint)
+            if version:
+                return version
+        return None
+
+    def _from_pyvenv_cfg(self, prefix: str) -> Optional[str]:
+        """venv/virtualenv/uv写入的pyvenv.cfg中的version或version_info"""
+        try:
+            with open(os.path.join(prefix, 'pyvenv.cfg'), 'r', errors='replace') as f:
+                match = self._CFG_RE.search(f.read())
+            return match.group(1) if match else None
+        except OSError:
+            return None
+
+    def _from_conda_meta(self, prefix: str) -> Optional[str]:
+        """conda环境中python包的安装记录文件名即包含版本号"""
+        try:
+            names = os.listdir(os.path.join(prefix, 'conda-meta'))
+        except OSError:
+            return None
+        for name in names:
+            match = self._CONDA_RE.match(name)
+            if match:
+                return match.group(1)
+        return None
+
+    def _from_layout(self, prefix: str, hint: Optional[str]) -> Optional[str]:
+        """根据lib/pythonX.Y目录和include/pythonX.Y/patchlevel.h确定版本"""
+        if hint is None:
+            try:
+                versions = {m.group(1) for m in map(self._LIB_RE.match, os.listdir(os.path.join(prefix, 'lib'))) if m}
+            except OSError:
+                return None
+            # 同一前缀下有多个版本时无法判断属于哪个解释器
+            if len(versions) != 1:
+                return None
+            hint = versions.pop()
+        elif not os.path.isdir(os.path.join(prefix, 'lib', f'python{hint}')):
+            return None
+
+        for suffix in ('', 'm', 'd', 't'):
+            try:
+                with open(os.path.join(prefix, 'include', f'python{hint}{suffix}', 'patchlevel.h'), 'r', errors='replace') as f:
+                    match = self._PATCHLEVEL_RE.search(f.read())
+                if match:
+                    return match.group(1)
+            except OSError:
+                continue
+        return hint
+
+class Installation:
+    """单个安装记录
+
+    使用__slots__代替dict保存字段，type/source等重复出现的字符串做intern处理；
+    同时提供install['path']、get()等按键访问接口，兼容原有的dict用法。
+    """
+    __slots__ = ('path', 'version', 'type', 'source', 'executable', 'vendor', 'arch', 'aliases', 'size',
+                 'manager', 'package')
+
+    def __init__(self, path: str, version: str = '', type: str = '', source: str = '',
+                 executable: str = '', vendor: str = '', arch: str = '', aliases: tuple = (),
+                 size: int = 0, manager: str = '', package: str = ''):
+        self.path = path
+        self.version = version
+        self.type = sys.intern(type)
+        self.source = sys.intern(source)
+        self.executable = executable
+        self.vendor = sys.intern(vendor)
+        self.arch = sys.intern(arch)
+        self.aliases = aliases
+        self.size = size
+        self.manager = sys.intern(manager)
+        self.package = sys.intern(package)
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value) -> None:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self) -> tuple:
+        return self.__slots__
+
+    def items(self) -> list:
+        return [(key, getattr(self, key)) for key in self.__slots__]
+
+    def to_dict(self) -> Dict[str, object]:
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"Installation({self.to_dict()!r})"
+
+    @classmethod
+    def memory_footprint(cls, records: list) -> Tuple[int, int]:
+        """统计记录本身占用的字节数，返回(当前总字节数, 改用dict时的总字节数)"""
+        slotted = sum(sys.getsizeof(record) for record in records)
+        as_dict = sum(sys.getsizeof(record.to_dict()) for record in records)
+        return slotted, as_dict
+
+class CondaDetector:
+    """Conda环境检测：读取各用户的environments.txt和.condarc，不启动任何进程"""
+
+    # 常见的conda发行版安装目录名
+    _BASE_RE = re.compile(r'^((ana|mini)conda\d*|(mini|mamba)forge\d*|micromamba|conda)$')
+    SYSTEM_CONDARC = ['/etc/conda/.condarc', '/etc/conda/condarc', '/var/lib/conda/.condarc']
+
+    def discover(self, homes: List[str]) -> List[Tuple[str, str]]:
+        """返回[(环境前缀, 来源)]，base安装标记为Conda，其余为Conda环境"""
+        candidates = []
+        envs_dirs = []
+        for home in homes:
+            candidates.extend(self._read_environments_txt(os.path.join(home, '.conda', 'environments.txt')))
+            envs_dirs.append(os.path.join(home, '.conda', 'envs'))
+            envs_dirs.extend(self._read_envs_dirs(os.path.join(home, '.condarc'), home))
+        for condarc in self.SYSTEM_CONDARC:
+            envs_dirs.extend(self._read_envs_dirs(condarc, None))
+
+        for parent in homes + ['/opt']:
+            try:
+                names = os.listdir(parent)
+            except OSError:
+                continue
+            candidates.extend(os.path.join(parent, name) for name in sorted(names) if self._BASE_RE.match(name))
+
+        # base安装的envs目录也是环境目录
+        for prefix in list(candidates):
+            if self.is_base(prefix):
+                envs_dirs.append(os.path.join(prefix, 'envs'))
+        for envs_dir in envs_dirs:
+            try:
+                names = os.listdir(envs_dir)
+            except OSError:
+                continue
+            candidates.extend(os.path.join(envs_dir, name) for name in sorted(names))
+
+        found = []
+        seen = set()
+        for prefix in candidates:
+            real = os.path.realpath(prefix)
+            if real in seen or not os.path.isdir(os.path.join(real, 'conda-meta')):
+                continue
+            seen.add(real)
+            found.append((real, 'Conda' if self.is_base(real) else 'Conda环境'))
+        return found
+
+    def is_base(self, prefix: str) -> bool:
+        """base安装带有condabin目录"""
+        return os.path.isdir(os.path.join(prefix, 'condabin'))
+
+    def _read_environments_txt(self, path: str) -> List[str]:
+        """conda在每次创建环境时把前缀追加到~/.conda/environments.txt"""
+        try:
+            with open(path, 'r', errors='replace') as f:
+                return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        except OSError:
+            return []
+
+    def _read_envs_dirs(self, condarc: str, home: Optional[str]) -> List[str]:
+        """读取.condarc中的envs_dirs(支持块列表和行内列表两种写法)"""
+        try:
+            with open(condarc, 'r', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return []
+
+        dirs = []
+        in_block = False
+        for line in lines:
+            match = re.match(r'^envs_dirs\s*:\s*(.*)$', line)
+            if match:
+                inline = match.group(1).strip()
+                if inline.startswith('['):
+                    dirs.extend(item.strip() for item in inline.strip('[]').split(','))
+                in_block = not inline
+                continue
+            if in_block:
+                item = re.match(r'^\s+-\s*(.+?)\s*$', line)
+                if item:
+                    dirs.append(item.group(1))
+                elif line.strip() and not line.startswith((' ', '\t')):
+                    in_block = False
+
+        result = []
+        for item in dirs:
+            item = item.strip('\'"')
+            if not item:
+                continue
+            if item.startswith('~') and home:
+                item = home + item[1:]
+            result.append(os.path.expanduser(item))
+        return result
+
+class PythonToolchainDetector:
+    """工具链管理器检测：直接读取pyenv、uv、asdf、mise和pipx的版本目录布局"""
+
+    def discover(self, homes: List[str]) -> List[Tuple[str, str, str]]:
+        """返回[(安装前缀, 管理器, 来源)]"""
+        found = []
+        seen = set()
+        for home in homes:
+            for manager, source, prefix in self._candidates(home):
+                real = os.path.realpath(prefix)
+                if real in seen or not os.path.isdir(os.path.join(real, 'bin')):
+                    continue
+                seen.add(real)
+                found.append((real, manager, source))
+        return found
+
+    def _candidates(self, home: str):
+        """按管理器列出某个用户的候选安装目录"""
+        current = home == os.path.expanduser('~')
+        data_home = os.environ.get('XDG_DATA_HOME') if current else None
+        data_home = data_home or os.path.join(home, '.local', 'share')
+
+        pyenv_root = (os.environ.get('PYENV_ROOT') if current else None) or os.path.join(home, '.pyenv')
+        for version in self._subdirs(os.path.join(pyenv_root, 'versions')):
+            yield 'pyenv', 'pyenv', version
+            # pyenv-virtualenv创建的环境位于versions/<版本>/envs下
+            for env in self._subdirs(os.path.join(version, 'envs')):
+                yield 'pyenv', 'pyenv虚拟环境', env
+
+        uv_root = (os.environ.get('UV_PYTHON_INSTALL_DIR') if current else None) or os.path.join(data_home, 'uv', 'python')
+        for version in self._subdirs(uv_root):
+            yield 'uv', 'uv托管Python', version
+        # uv tool install创建的工具虚拟环境，与pipx的venvs相同
+        uv_tools = (os.environ.get('UV_TOOL_DIR') if current else None) or os.path.join(data_home, 'uv', 'tools')
+        for venv in self._subdirs(uv_tools):
+            yield 'uv', 'uv工具虚拟环境', venv
+
+        asdf_root = (os.environ.get('ASDF_DATA_DIR') if current else None) or os.path.join(home, '.asdf')
+        for version in self._subdirs(os.path.join(asdf_root, 'installs', 'python')):
+            yield 'asdf', 'asdf', version
+
+        mise_root = (os.environ.get('MISE_DATA_DIR') if current else None) or os.path.join(data_home, 'mise')
+        for version in self._subdirs(os.path.join(mise_root, 'installs', 'python')):
+            yield 'mise', 'mise', version
+
+        pipx_roots = [os.path.join(data_home, 'pipx'), os.path.join(home, '.local', 'pipx')]
+        if current and os.environ.get('PIPX_HOME'):
+            pipx_roots.insert(0, os.environ['PIPX_HOME'])
+        for pipx_root in pipx_roots:
+            for venv in self._subdirs(os.path.join(pipx_root, 'venvs')):
+                yield 'pipx', 'pipx虚拟环境', venv
+
+    def _subdirs(self, parent: str) -> List[str]:
+        """列出版本目录；隐藏项(锁文件、缓存)和符号链接别名(如mise的latest、3.12)不计入"""
+        try:
+            with os.scandir(parent) as it:
+                return sorted(
+                    entry.path for entry in it
+                    if not entry.name.startswith('.') and entry.is_dir(follow_symlinks=False)
+                )
+        except OSError:
+            return []
+
+class JavaToolchainDetector:
+    """JDK管理器检测：读取SDKMAN、jenv、asdf、mise、Gradle和Maven toolchains的元数据，不启动JVM"""
+
+    def discover(self, homes: List[str]) -> List[Tuple[str, str, str, bool]]:
+        """返回[(路径, 管理器, 来源, 是否由该管理器拥有)]
+
+        jenv版本、SDKMAN的current和本地版本、mise别名以及toolchains.xml条目
+        只是指向其他JDK的引用，owned为False。
+        """
+        found = []
+        seen = set()
+        for home in homes:
+            for item in self._candidates(home):
+                if item[0] not in seen:
+                    seen.add(item[0])
+                    found.append(item)
+        return found
+
+    def _candidates(self, home: str):
+        """按管理器列出某个用户的候选JDK"""
+        current = home == os.path.expanduser('~')
+        data_home = os.environ.get('XDG_DATA_HOME') if current else None
+        data_home = data_home or os.path.join(home, '.local', 'share')
+
+        sdkman_root = (os.environ.get('SDKMAN_DIR') if current else None) or os.path.join(home, '.sdkman')
+        for entry in self._entries(os.path.join(sdkman_root, 'candidates', 'java')):
+            # current和通过sdk install java <名称> <路径>登记的本地JDK都是符号链接，只记为引用
+            yield entry.path, 'sdkman', 'SDKMAN安装', not entry.is_symlink()
+
+        jenv_root = (os.environ.get('JENV_ROOT') if current else None) or os.path.join(home, '.jenv')
+        for entry in self._entries(os.path.join(jenv_root, 'versions')):
+            yield entry.path, 'jenv', 'jenv', False
+
+        asdf_root = (os.environ.get('ASDF_DATA_DIR') if current else None) or os.path.join(home, '.asdf')
+        for entry in self._entries(os.path.join(asdf_root, 'installs', 'java')):
+            yield entry.path, 'asdf', 'asdf', True
+
+        mise_root = (os.environ.get('MISE_DATA_DIR') if current else None) or os.path.join(data_home, 'mise')
+        for entry in self._entries(os.path.join(mise_root, 'installs', 'java')):
+            # mise的latest、17等别名是符号链接
+            yield entry.path, 'mise', 'mise', not entry.is_symlink()
+
+        gradle_home = (os.environ.get('GRADLE_USER_HOME') if current else None) or os.path.join(home, '.gradle')
+        for entry in self._entries(os.path.join(gradle_home, 'jdks')):
+            if entry.is_symlink() or not entry.is_dir():
+                continue
+            # 旧版Gradle把JDK解压在下一级目录中
+            if os.path.isdir(os.path.join(entry.path, 'bin')):
+                yield entry.path, 'gradle', 'Gradle工具链', True
+            else:
+                for sub in self._entries(entry.path):
+                    if sub.is_dir(follow_symlinks=False) and os.path.isdir(os.path.join(sub.path, 'bin')):
+                        yield sub.path, 'gradle', 'Gradle工具链', True
+
+        for jdk_home in self._maven_toolchains(os.path.join(home, '.m2', 'toolchains.xml')):
+            yield jdk_home, 'maven', 'Maven toolchains', False
+
+    def _entries(self, parent: str) -> List[os.DirEntry]:
+        """列出目录项，跳过锁文件、标记文件等隐藏项"""
+        try:
+            with os.scandir(parent) as it:
+                return sorted((entry for entry in it if not entry.name.startswith('.')), key=lambda e: e.name)
+        except OSError:
+            return []
+
+    def _maven_toolchains(self, path: str) -> List[str]:
+        """读取toolchains.xml中type为jdk的jdkHome"""
+        try:
+            root = ET.parse(path).getroot()
+        except (OSError, ET.ParseError):
+            return []
+        homes = []
+        # toolchains.xml可能带命名空间，按本地标签名匹配
+        for toolchain in root.iter():
+            if toolchain.tag.rsplit('}', 1)[-1] != 'toolchain':
+                continue
+            fields = {child.tag.rsplit('}', 1)[-1]: child for child in toolchain.iter()}
+            if (fields.get('type') is None or (fields['type'].text or '').strip() != 'jdk'
+                    or fields.get('jdkHome') is None):
+                continue
+            jdk_home = (fields['jdkHome'].text or '').strip()
+            if jdk_home and not jdk_home.startswith('$'):
+                homes.append(os.path.expanduser(jdk_home))
+        return homes
+
+class InstallationRegistry:
+    """安装记录登记表
+
+    按规范化真实路径和(st_dev, st_ino)两种键去重，查找均为O(1)；
+    经符号链接、硬链接或绑定挂载到达的重复路径记录在规范条目的aliases中。
+    """
+
+    def __init__(self):
+        self._records = []
+        self._by_path = {}
+        self._by_inode = {}
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index]
+
+    def copy(self) -> list:
+        return list(self._records)
+
+    def _inode_key(self, path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    def find(self, path: str) -> Optional[Installation]:
+        """查找路径对应的已登记安装，不存在时返回None"""
+        record = self._by_path.get(path)
+        if record is None:
+            key = self._inode_key(path)
+            if key is not None:
+                record = self._by_inode.get(key)
+        return record
+
+    def add(self, record: Installation, alias: Optional[str] = None) -> Installation:
+        """登记新的安装记录，alias为发现该安装时使用的原始路径"""
+        self._records.append(record)
+        self._by_path[record['path']] = record
+        key = self._inode_key(record['path'])
+        if key is not None:
+            self._by_inode.setdefault(key, record)
+        if alias:
+            self.add_alias(record, alias)
+        return record
+
+    def add_alias(self, record: Installation, path: str) -> None:
+        """把指向同一安装的其他路径记录为别名"""
+        if path == record['path'] or path in self._by_path:
+            return
+        # 别名很少，使用元组避免每条记录都持有一个空列表
+        record['aliases'] = record['aliases'] + (path,)
+        self._by_path[path] = record
+
+class RemovalPlan:
+    """删除计划优化：把计划删除的路径放入前缀树，合并重复项和已包含在上级目录中的安装
+
+    同一棵子树只会被处理一次；被合并的安装随所在的上级目录一起删除。
+    """
+
+    def __init__(self, installs: list):
+        self.operations = []
+        # {保留的路径: 合并进来的安装}
+        self.covered = {}
+        self.duplicates = 0
+        root = {}
+        # 按路径分量排序，保证祖先先于后代插入
+        for install in sorted(installs, key=lambda install: self._parts(install['path'])):
+            node = root
+            ancestor = None
+            for part in self._parts(install['path']):
+                if None in node:
+                    ancestor = node[None]
+                    break
+                node = node.setdefault(part, {})
+            else:
+                if None in node:
+                    ancestor = node[None]
+                    self.duplicates += 1
+            if ancestor is not None:
+                self.covered[ancestor['path']].append(install)
+                continue
+            # 新的保留项；其子树不会再有保留项，直接丢弃已有的子节点
+            node.clear()
+            node[None] = install
+            self.covered[install['path']] = []
+            self.operations.append(install)
+
+    @staticmethod
+    def _parts(path: str) -> tuple:
+        return tuple(part for part in os.path.normpath(path).split(os.sep) if part)
+
+    def weight(self, install) -> int:
+        """删除该项的预估工作量：自身加上被合并的各安装的大小"""
+        return install['size'] + sum(covered['size'] for covered in self.covered.get(install['path'], ()))
+
+    def saved(self) -> Tuple[int, int]:
+        """返回(省去的删除操作数, 这些操作原本会重复遍历的字节数)"""
+        collapsed = [covered for group in self.covered.values() for covered in group]
+        return len(collapsed), sum(covered['size'] for covered in collapsed)
+
+class RemovalEngine:
+    """基于dir_fd的并行删除引擎
+
+    所有待删除的目录树共享一个任务队列，按目录拆分任务，空闲线程可以处理任一安装的目录；
+    安装按大小从大到小入队。每个子目录都相对父目录的fd以O_NOFOLLOW打开，并用fstat核对
+    与列目录时看到的(st_dev, st_ino)一致，父目录的fd一直保持到其子目录全部删除，
+    rmdir同样相对父目录的fd执行，因此扫描后被替换成符号链接的中间目录不会把删除带到树外。
+    从不跟随符号链接，遇到其他文件系统的挂载点即停止。单个文件删除失败只记录下来，不影响其余删除。
+    """
+
+    _OPEN_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) | getattr(os, 'O_NOFOLLOW', 0)
+
+    class _Node:
+        """待删除的目录；pending为尚未完成的子目录数加上自身的列目录任务
+
+        fd在列目录时打开，供子目录相对打开和rmdir使用，目录完成时关闭；
+        顶层目录另持有其所在目录的fd(anchor)。
+        """
+        __slots__ = ('path', 'name', 'parent', 'report', 'dev', 'ino', 'fd', 'anchor', 'pending', 'failed')
+
+        def __init__(self, path: str, name: str, parent, report: dict, dev: int, ino: int, anchor: Optional[int] = None):
+            self.path = path
+            self.name = name
+            self.parent = parent
+            self.report = report
+            self.dev = dev
+            self.ino = ino
+            self.fd = None
+            self.anchor = anchor
+            self.pending = 1
+            self.failed = False
+
+        def dir_fd(self) -> int:
+            """所在目录的fd"""
+            return self.parent.fd if self.parent is not None else self.anchor
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = max(1, workers or min(32, (os.cpu_count() or 1) + 4))
+
+    def remove(self, targets: List[Tuple[str, int]]) -> Dict[str, dict]:
+        """删除[(路径, 预估大小)]，返回{路径: {'files', 'dirs', 'failures': [(路径, 原因)]}}"""
+        reports = {}
+        queue = deque()
+        for path, _ in sorted(targets, key=lambda target: target[1]):
+            report = reports[path] = {'files': 0, 'dirs': 0, 'failures': []}
+            parent, name = os.path.split(os.path.normpath(path))
+            try:
+                anchor = os.open(parent or os.curdir, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                report['failures'].append((path, e.strerror or str(e)))
+                continue
+            try:
+                st = os.stat(name, dir_fd=anchor, follow_symlinks=False)
+                if stat.S_ISDIR(st.st_mode):
+                    # 最大的安装最后入队、最先被取出；anchor交给节点，目录完成时关闭
+                    queue.append(self._Node(path, name, None, report, st.st_dev, st.st_ino, anchor))
+                    anchor = None
+                    continue
+                # 单个文件或符号链接本身
+                os.unlink(name, dir_fd=anchor)
+                report['files'] += 1
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                report['failures'].append((path, e.strerror or str(e)))
+            finally:
+                if anchor is not None:
+                    os.close(anchor)
+
+        cond = threading.Condition()
+        pending = [len(queue)]
+        threads = [
+            threading.Thread(target=self._worker, args=(queue, cond, pending), daemon=True)
+            for _ in range(min(self.workers, max(1, len(queue))))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return reports
+
+    def _worker(self, queue: deque, cond: threading.Condition, pending: list) -> None:
+        """工作线程：后进先出地处理目录，保持深度优先以减少同时打开的目录"""
+        while True:
+            with cond:
+                while not queue and pending[0]:
+                    cond.wait(0.05)
+                if not queue:
+                    return
+                node = queue.pop()
+
+            children, files = self._clear(node)
+            with cond:
+                node.report['files'] += files
+                for child in children:
+                    node.pending += 1
+                    queue.append(child)
+                pending[0] += len(children) - 1
+                finished = self._finish(node)
+                if children or pending[0] == 0:
+                    cond.notify_all()
+            # rmdir放在锁外执行；完成一个目录可能连带完成各级父目录
+            while finished is not None:
+                removed = self._rmdir(finished)
+                with cond:
+                    finished.report['dirs'] += removed
+                    finished = self._finish(finished.parent) if finished.parent is not None else None
+
+    def _open(self, node) -> Optional[int]:
+        """相对父目录的fd打开目录，并确认它仍是列目录时看到的那个目录"""
+        try:
+            fd = os.open(node.name, self._OPEN_FLAGS, dir_fd=node.dir_fd())
+        except OSError as e:
+            self._fail(node, node.path, e)
+            return None
+        try:
+            st = os.fstat(fd)
+        except OSError as e:
+            os.close(fd)
+            self._fail(node, node.path, e)
+            return None
+        if (st.st_dev, st.st_ino) != (node.dev, node.ino):
+            os.close(fd)
+            self._fail(node, node.path, '目录在扫描后被替换，已停止')
+            return None
+        return fd
+
+    def _clear(self, node) -> Tuple[list, int]:
+        """删除目录中的文件，返回(需要继续处理的子目录, 已删除的文件数)"""
+        fd = node.fd = self._open(node)
+        if fd is None:
+            return [], 0
+
+        children = []
+        files = 0
+        try:
+            with os.scandir(fd) as it:
+                for entry in it:
+                    path = os.path.join(node.path, entry.name)
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            if st.st_dev != node.dev:
+                                self._fail(node, path, '挂载点，已停止')
+                                continue
+                            children.append(self._Node(path, entry.name, node, node.report, st.st_dev, st.st_ino))
+                            continue
+                        os.unlink(entry.name, dir_fd=fd)
+                        files += 1
+                    except OSError as e:
+                        self._fail(node, path, e)
+        except OSError as e:
+            self._fail(node, node.path, e)
+        return children, files
+
+    def _finish(self, node):
+        """完成一个任务(调用方持有锁)，目录的全部任务完成时返回该目录"""
+        node.pending -= 1
+        if node.pending:
+            return None
+        if node.failed and node.parent is not None:
+            # 子树中有残留，父目录也无法删除
+            node.parent.failed = True
+        return node
+
+    def _rmdir(self, node) -> int:
+        """关闭已完成目录的fd并删除该目录，返回删除的目录数；子树有残留时保留"""
+        if node.fd is not None:
+            os.close(node.fd)
+            node.fd = None
+        try:
+            if node.failed:
+                return 0
+            dir_fd = node.dir_fd()
+            try:
+                # rmdir前再核对一次，名字已指向别的目录时保留
+                st = os.stat(node.name, dir_fd=dir_fd, follow_symlinks=False)
+                if (st.st_dev, st.st_ino) != (node.dev, node.ino):
+                    self._fail(node, node.path, '目录在扫描后被替换，已停止')
+                    return 0
+                os.rmdir(node.name, dir_fd=dir_fd)
+                return 1
+            except OSError as e:
+                self._fail(node, node.path, e)
+                return 0
+        finally:
+            if node.anchor is not None:
+                os.close(node.anchor)
+                node.anchor = None
+
+    def _fail(self, node, path: str, error) -> None:
+        """记录失败项；失败的目录及其上级都会保留"""
+        node.failed = True
+        if node.parent is not None:
+            node.parent.failed = True
+        reason = error if isinstance(error, str) else (error.strerror or str(error))
+        node.report['failures'].append((path, reason))
+
+class DiskUsage:
+    """并行统计计划删除的安装实际可释放的空间
+
+    按st_blocks计算占用，每个(st_dev, st_ino)只计一次；只有全部硬链接都在计划内的文件
+    才算作可释放(conda的包缓存通过硬链接共享到各环境中)。不跨越挂载点。
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers
+        self._owners = {}
+
+    def measure(self, paths: List[str]) -> Tuple[Dict[str, int], int, int]:
+        """返回({路径: 该安装独占的可释放字节数}, 计划整体可释放字节数, 按链接逐个累加的字节数)"""
+        self._owners = {}
+        entries = []
+        roots = []
+        for index, path in enumerate(paths):
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                # 目录的st_nlink包含子目录的..，不表示硬链接
+                entries.append((st.st_dev, st.st_ino, st.st_blocks * 512, 1, index))
+                self._owners[path] = (index, st.st_dev)
+                roots.append(path)
+            else:
+                entries.append((st.st_dev, st.st_ino, st.st_blocks * 512, st.st_nlink, index))
+
+        # 嵌套在其他安装内的安装不单独遍历，遍历到时改记在它自己名下
+        outer = [root for root in roots if not any(root.startswith(other.rstrip('/') + '/') for other in roots)]
+        if outer:
+            entries.extend(ParallelWalker(self.workers).walk(outer, self._visit))
+
+        inodes = {}
+        apparent = 0
+        for dev, ino, size, nlink, index in entries:
+            apparent += size
+            record = inodes.get((dev, ino))
+            if record is None:
+                inodes[(dev, ino)] = [size, nlink, 1, {index}]
+            else:
+                record[2] += 1
+                record[3].add(index)
+
+        unique = [0] * len(paths)
+        reclaimable = 0
+        for size, nlink, seen, owners in inodes.values():
+            # 计划外仍有硬链接的文件删除后不会释放空间
+            if seen < nlink:
+                continue
+            reclaimable += size
+            if len(owners) == 1:
+                unique[next(iter(owners))] += size
+        return {path: unique[index] for index, path in enumerate(paths)}, reclaimable, apparent
+
+    def _visit(self, root: str, dirs: list, files: list) -> list:
+        """统计单个目录中的各项(由遍历线程调用)"""
+        index, dev = self._owners[root]
+        found = []
+        keep = []
+        for entry in dirs + files:
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            owner, nlink = index, st.st_nlink
+            if stat.S_ISDIR(st.st_mode):
+                if st.st_dev != dev:
+                    # 挂载点：不统计，也不进入
+                    continue
+                # 嵌套的其他安装保留自己的归属
+                owner, nlink = self._owners.setdefault(entry.path, (index, dev))[0], 1
+                keep.append(entry)
+            found.append((st.st_dev, st.st_ino, st.st_blocks * 512, nlink, owner))
+        # 指向目录的符号链接和挂载点不再进入
+        dirs[:] = keep
+        return found
+
+class PackageIndex:
+    """软件包文件归属索引
+
+    逐个流式读取dpkg的info/*.list，存在rpm数据库时再读取rpm -qa的文件列表，
+    路径的父目录解析为真实路径(/bin与/usr/bin合并的系统上两者一致)后登记为{路径: 包名}。
+    精确查询为一次字典查找；另保存排好序的路径列表，用二分查找判断某目录下是否有软件包文件。
+    结果按包数据库的mtime缓存，数据库未变化时启动只需读取缓存。
+    """
+
+    DPKG_INFO = '/var/lib/dpkg/info'
+    RPM_DBS = ('/var/lib/rpm', '/usr/lib/sysimage/rpm')
+    # 包数据库有任何变化时这些文件的mtime都会改变
+    STAMPS = ('/var/lib/dpkg/status', '/var/lib/dpkg/info',
+              '/var/lib/rpm/rpmdb.sqlite', '/var/lib/rpm/Packages',
+              '/usr/lib/sysimage/rpm/rpmdb.sqlite', '/usr/lib/sysimage/rpm/Packages')
+
+    def __init__(self, cache_path: str = PACKAGE_INDEX_PATH, write_cache: bool = True):
+        self.cache_path = cache_path
+        self.signature = self._signature()
+        self.available = bool(self.signature)
+        self.cached = False
+        self.manager = 'dpkg' if os.path.isdir(self.DPKG_INFO) else 'rpm'
+        self.owners = {}
+        self._sorted = []
+        if self.available:
+            self.cached = self._read_cache()
+            if not self.cached:
+                self._build()
+                # --dry-run时只使用已有的缓存，不写入
+                if write_cache:
+                    self._write_cache()
+            self._sorted = sorted(self.owners)
+
+    def __len__(self) -> int:
+        return len(self.owners)
+
+    def _signature(self) -> str:
+        stamps = []
+        for path in self.STAMPS:
+            try:
+                stamps.append(f"{path}:{os.stat(path).st_mtime_ns}")
+            except OSError:
+                continue
+        return '|'.join(stamps)
+
+    def _build(self) -> None:
+        parents = {}
+
+        def add(path: str, package: str) -> None:
+            parent, name = os.path.split(path)
+            if not name:
+                return
+            real = parents.get(parent)
+            if real is None:
+                real = parents[parent] = os.path.realpath(parent)
+            # 目录可能同时属于多个包，保留第一个
+            self.owners.setdefault(os.path.join(real, name), package)
+
+        for list_file in glob.glob(os.path.join(self.DPKG_INFO, '*.list')):
+            # 多架构的包名带有:arch后缀
+            package = sys.intern(os.path.basename(list_file)[:-len('.list')].split(':')[0])
+            try:
+                with open(list_file, encoding='utf-8', errors='surrogateescape') as f:
+                    for line in f:
+                        path = line.rstrip('\n')
+                        if path and path != '/.':
+                            add(path, package)
+            except OSError:
+                continue
+
+        rpm = shutil.which('rpm')
+        if rpm and any(os.path.isdir(path) and os.listdir(path) for path in self.RPM_DBS):
+            try:
+                proc = subprocess.Popen([rpm, '-qa', '--qf', '[%{NAME}\t%{FILENAMES}\n]'],
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, errors='surrogateescape')
+            except OSError:
+                return
+            with proc:
+                for line in proc.stdout:
+                    package, sep, path = line.rstrip('\n').partition('\t')
+                    if sep and path.startswith('/'):
+                        add(path, sys.intern(package))
+
+    def _read_cache(self) -> bool:
+        try:
+            with open(self.cache_path, 'rb') as f:
+                data = json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            return False
+        if data.get('signature') != self.signature:
+            return False
+        self.manager = data.get('manager', self.manager)
+        for package, paths in data['owners'].items():
+            package = sys.intern(package)
+            for path in paths:
+                self.owners[path] = package
+        return True
+
+    def _write_cache(self) -> None:
+        """按包名分组写入缓存；缓存只是加速手段，写入失败时忽略"""
+        grouped = {}
+        for path, package in self.owners.items():
+            grouped.setdefault(package, []).append(path)
+        data = json.dumps({'signature': self.signature, 'manager': self.manager, 'owners': grouped},
+                          ensure_ascii=False).encode('utf-8', errors='surrogateescape')
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix='.package-index.', dir=os.path.dirname(self.cache_path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(zlib.compress(data, 1))
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+    def owner(self, path: str) -> Optional[str]:
+        """path本身所属的软件包(索引按父目录的真实路径登记，/bin/ls与/usr/bin/ls等价)"""
+        package = self.owners.get(path)
+        if package is None:
+            parent, name = os.path.split(path)
+            package = self.owners.get(os.path.join(os.path.realpath(parent), name))
+        return package
+
+    def owned_under(self, path: str) -> Optional[str]:
+        """path目录下任一软件包文件所属的软件包"""
+        prefix = path.rstrip('/') + '/'
+        i = bisect.bisect_left(self._sorted, prefix)
+        if i < len(self._sorted) and self._sorted[i].startswith(prefix):
+            return self.owners[self._sorted[i]]
+        return None
+
+    def package_of(self, install) -> Optional[str]:
+        """安装(路径、别名或其中的文件)所属的软件包"""
+        for path in (install['path'], *install['aliases']):
+            package = self.owner(path)
+            if package:
+                return package
+        return self.owned_under(install['path'])
+
+    def removal_hint(self, package: str) -> str:
+        return f"apt remove {package}" if self.manager == 'dpkg' else f"dnf remove {package}"
+
+class RemovedPaths:
+    """计划删除的路径集合；判断某路径是否位于其中某项内部时逐级检查前缀，与集合大小无关"""
+
+    def __init__(self, paths: List[str]):
+        self.paths = {os.path.normpath(path) for path in paths if path}
+
+    def __contains__(self, path: str) -> bool:
+        path = os.path.normpath(path)
+        while True:
+            if path in self.paths:
+                return True
+            parent = os.path.dirname(path)
+            if parent == path:
+                return False
+            path = parent
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+class AlternativesDB:
+    """alternatives管理数据库(update-alternatives/alternatives的管理文件)
+
+    每个链接组一个文件：模式、主链接、从链接(名称和路径)列表、空行，
+    然后是各候选项的目标路径、优先级和对应的从链接目标。Debian和RHEL的格式相同，
+    RHEL的目标路径可能带@family@前缀。整个目录只读取一次，得到所有链接组。
+    """
+
+    def __init__(self, admin_dirs: Tuple[str, ...] = ALTERNATIVES_DIRS):
+        self.admin_dir = next((path for path in admin_dirs if os.path.isdir(path)), None)
+        if self.admin_dir == '/var/lib/dpkg/alternatives':
+            self.tool = 'update-alternatives'
+        else:
+            self.tool = shutil.which('alternatives') or 'update-alternatives'
+        # {组名: {'mode', 'link', 'slaves': [(名称, 链接)], 'choices': [(目标, 优先级, [从链接目标])]}}
+        self.groups = {}
+        if self.admin_dir is not None:
+            self._load()
+
+    def _load(self) -> None:
+        with os.scandir(self.admin_dir) as it:
+            for entry in it:
+                if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    self.groups[entry.name] = self._parse(entry.path)
+                except (OSError, IndexError):
+                    # 损坏或正在被改写的文件，交给update-alternatives自己处理
+                    continue
+
+    @staticmethod
+    def _parse(path: str) -> dict:
+        with open(path, encoding='utf-8', errors='surrogateescape') as f:
+            lines = f.read().split('\n')
+        group = {'mode': lines[0], 'link': lines[1], 'slaves': [], 'choices': []}
+        i = 2
+        while lines[i]:
+            group['slaves'].append((lines[i], lines[i + 1]))
+            i += 2
+        i += 1
+        width = len(group['slaves'])
+        while i < len(lines) and lines[i]:
+            target = lines[i]
+            if target.startswith('@'):
+                target = target.split('@', 2)[2]
+            group['choices'].append((target, lines[i + 1], lines[i + 2:i + 2 + width]))
+            i += 2 + width
+        return group
+
+    def choices(self, name: str) -> List[str]:
+        """链接组name的所有候选目标"""
+        group = self.groups.get(name)
+        return [target for target, _, _ in group['choices']] if group else []
+
+    def plan(self, removed: RemovedPaths) -> List[Tuple[str, List[str], bool]]:
+        """找出候选项指向removed的链接组，返回[(组名, 受影响的目标, 是否整组移除)]"""
+        plan = []
+        for name, group in sorted(self.groups.items()):
+            targets = [target for target, _, _ in group['choices']]
+            hits = [target for target in targets if target in removed or os.path.realpath(target) in removed]
+            if hits:
+                plan.append((name, hits, len(hits) == len(targets)))
+        return plan
+
+    def apply(self, plan: List[Tuple[str, List[str], bool]]) -> List[Tuple[str, str]]:
+        """执行移除，返回[(组名, 错误信息)]；整组受影响时一次--remove-all，否则只移除受影响的目标"""
+        results = []
+        # update-alternatives会改写同目录下的管理文件，逐组顺序执行
+        for name, hits, everything in plan:
+            if everything and not self._run(['--remove-all', name]):
+                results.append((name, ''))
+                continue
+            # 部分受影响，或旧版alternatives不支持--remove-all时，逐个移除
+            errors = [self._run(['--remove', name, target]) for target in hits]
+            results.append((name, next((error for error in errors if error), '')))
+        return results
+
+    def _run(self, args: List[str]) -> str:
+        """运行一次管理命令，返回错误信息(成功时为空)"""
+        try:
+            result = subprocess.run([self.tool, *args], capture_output=True, text=True)
+        except OSError as e:
+            return str(e)
+        if result.returncode:
+            return result.stderr.strip() or f"退出码 {result.returncode}"
+        return ''
+
+class RcMatcher:
+    """环境文件的精确匹配规则，按已删除的安装路径编译一次，各文件、各线程共用
+
+    识别shell/fish的变量赋值和export行、environment.d和/etc/environment的NAME=value行，
+    以及conda/mamba initialize块和SDKMAN的初始化段落：
+    - PATH类变量只去掉指向已删除安装内部的条目(${VAR:+:$VAR}等参数展开作为整体处理)，其余条目原样保留；
+    - 每行按;、&和复合命令关键字拆成单条命令，只删除引用了已删除安装内部的路径(或值为这类路径的变量)的命令，
+      同一行的其他命令保留；
+    - if/for/while/case/{ }等复合命令缓存到结束再处理：条件、循环头和case模式原样保留，
+      分支中的命令全部被删除时补一个空命令:，不会留下不完整的语法结构；
+    - initialize块中任一行引用了已删除的安装时整块删除。
+    每行只做常数次正则匹配，块内容只缓存一次，处理时间与文件行数成线性关系。
+    """
+
+    PATH_VARS = frozenset({
+        'PATH', 'MANPATH', 'INFOPATH', 'LD_LIBRARY_PATH', 'PKG_CONFIG_PATH', 'PYTHONPATH', 'CLASSPATH'
+    })
+    _ASSIGN_RE = re.compile(
+        r'^(\s*(?:export\s+|declare\s+-x\s+|typeset\s+-x\s+|readonly\s+)?)([A-Za-z_]\w*)=(.*?)(\s*)$')
+    _FISH_SET_RE = re.compile(r'^(\s*set\s+(?:-\w+\s+)*)([A-Za-z_]\w*)\s+(.*?)(\s*)$')
+    _BLOCK_START_RE = re.compile(r'^\s*#\s*>>>\s*(conda|mamba) initialize\s*>>>')
+    _BLOCK_END_RE = re.compile(r'^\s*#\s*<<<\s*(conda|mamba) initialize\s*<<<')
+    # SDKMAN安装时写入的提示行，紧随其后的是SDKMAN_DIR和sdkman-init.sh两行
+    _SDKMAN_MARK_RE = re.compile(r'^\s*#THIS MUST BE AT THE END OF THE FILE FOR SDKMAN TO WORK')
+    _PATH_TOKEN_RE = re.compile(r'(?:~|\$\{?[A-Za-z_]\w*\}?)?/[^\s"\'`:;|&<>()]*|\$\{?[A-Za-z_]\w*\}?')
+    _VAR_RE = re.compile(r'\$\{?([A-Za-z_]\w*)\}?')
+    # ${NAME:+...}形式的条件展开，PATH类变量常用它在原值非空时才加分隔符
+    _CONDITIONAL_RE = re.compile(r'^\$\{([A-Za-z_]\w*)(:?\+)(.*)\}$', re.S)
+    # 拆分命令前，先把引号、命令替换、参数展开和注释替换为等长的占位字符
+    _QUOTED_RE = re.compile(
+        r'\\.|\'[^\']*\'|"(?:\\.|[^"\\])*"|`(?:\\.|[^`\\])*`|\$\((?:[^()]|\([^()]*\))*\)|\$\{[^{}]*\}', re.S)
+    _COMMENT_RE = re.compile(r'(?:^|(?<=[\s;&|()]))#.*')
+    # 2>&1、&>file等重定向属于单词，不是分隔符
+    _TOKEN_RE = re.compile(r'\n|;;&|;;|;&|&&|\|\||\|&|(?:[<>]&|&>|[^\s;&|()])+|[;&|()]')
+    _SEPARATORS = frozenset({';', '&', '\n'})
+    _CASE_ENDS = frozenset({';;', ';&', ';;&'})
+    _LIST_OPERATORS = frozenset({'&&', '||', '|', '|&'})
+    _HEREDOC_RE = re.compile(r'(?<!<)<<(?!<)(-?)\s*([\'"]?)([A-Za-z_]\w*)\2')
+
+    def __init__(self, removed: RemovedPaths):
+        self.removed = removed
+
+    def editor(self, home: Optional[str], fish: bool = False) -> 'RcMatcher._Editor':
+        """为单个文件创建有状态的编辑器；home用于展开~和$HOME(系统文件为None)，fish表示按fish语法解析"""
+        return self._Editor(self, home, fish)
+
+    def mask(self, text: str) -> Optional[str]:
+        """把引号内容、命令替换、参数展开和注释替换为等长的占位字符；引号未闭合时返回None
+
+        长度不变，拆分出的位置可以直接用于原文。
+        """
+        masked = self._QUOTED_RE.sub(lambda match: '_' * len(match.group()), text)
+        masked = self._COMMENT_RE.sub(lambda match: ' ' * len(match.group()), masked)
+        if any(quote in masked for quote in '\'"`') or '$(' in masked:
+            return None
+        return masked
+
+    class _Editor:
+        """逐行处理一个文件：feed返回该行处理后应输出的行，finish输出缓存的剩余内容
+
+        续行(行尾反斜杠)、跨行的引号字符串和here-document先拼成一条完整命令再处理；
+        每条命令再按;、&和复合命令关键字拆成片段，逐个判断。
+        """
+
+        def __init__(self, matcher: 'RcMatcher', home: Optional[str], fish: bool = False):
+            self.matcher = matcher
+            self.fish = fish
+            self.vars = {'HOME': home} if home else {}
+            self.changed = 0
+            self._block = None
+            self._pending = None
+            # 正在拼接的命令(多个物理行)和here-document的结束标记
+            self._unit = None
+            self._heredoc = None
+            # 正在缓存的复合命令[(物理行列表, 片段)]，以及尚未结束的复合命令类型
+            self._construct = None
+            self._frames = []
+
+        def feed(self, line: str) -> List[str]:
+            matcher = self.matcher
+            if self._block is not None:
+                self._block.append(line)
+                if matcher._BLOCK_END_RE.match(line):
+                    return self._flush_block()
+                return []
+            if self._unit is not None:
+                self._unit.append(line)
+                if self._heredoc is not None:
+                    strip_tabs, delimiter = self._heredoc
+                    body = line.rstrip('\r\n')
+                    if (body.lstrip('\t') if strip_tabs else body) != delimiter:
+                        return []
+                    self._heredoc = None
+                elif self._continues(self._unit):
+                    return []
+                unit, self._unit = self._unit, None
+                return self._process(unit)
+            if self._construct is None and matcher._BLOCK_START_RE.match(line):
+                self._block = [line]
+                return self._release()
+
+            self._unit = [line]
+            if not line.lstrip().startswith('#'):
+                heredoc = matcher._HEREDOC_RE.search(line)
+                if heredoc:
+                    self._heredoc = (heredoc.group(1) == '-', heredoc.group(3))
+                    return []
+            if self._continues(self._unit):
+                return []
+            unit, self._unit = self._unit, None
+            return self._process(unit)
+
+        def finish(self) -> List[str]:
+            out = []
+            if self._unit is not None:
+                # 未结束的续行或here-document原样保留
+                out.extend(self._unit)
+                self._unit = self._heredoc = None
+            if self._construct is not None:
+                # 复合命令没有结束，原样保留
+                construct, self._construct = self._construct, None
+                self._frames = []
+                out = [line for unit, _ in construct for line in unit] + out
+            if self._block is not None:
+                # 块没有结束标记，原样保留
+                block, self._block = self._block, None
+                out = block + out
+            return self._release() + out
+
+        def _continues(self, unit: List[str]) -> bool:
+            """命令是否还没有结束(行尾反斜杠或引号未闭合)"""
+            body = unit[-1].rstrip('\r\n')
+            if body.lstrip().startswith('#') and len(unit) == 1:
+                return False
+            return body.endswith('\\') or self.matcher.mask(''.join(unit)) is None
+
+        def _process(self, unit: List[str]) -> List[str]:
+            """处理一条完整的命令(可能跨多个物理行)"""
+            pieces = self._pieces(self._command_text(unit))
+            if self._construct is not None or self._frames:
+                # 复合命令缓存到结束为止，再统一判断各分支
+                out = self._release() if self._construct is None else []
+                if self._construct is None:
+                    self._construct = []
+                self._construct.append((unit, pieces))
+                if self._frames:
+                    return out
+                construct, self._construct = self._construct, None
+                return out + self._apply(construct)
+
+            line = unit[0]
+            if len(unit) == 1 and self.matcher._SDKMAN_MARK_RE.match(line):
+                # 提示行是否保留取决于后面的初始化行
+                out = self._release()
+                self._pending = [line]
+                return out
+            if self._pending is not None and len(unit) == 1 and not line.strip():
+                self._pending.append(line)
+                return []
+
+            edited = self._apply([(unit, pieces)])
+            if not edited:
+                # 提示行随其后被删除的初始化行一起删除
+                self.changed += len(self._pending or [])
+                self._pending = None
+                return []
+            return self._release() + edited
+
+        def _command_text(self, unit: List[str]) -> str:
+            """命令本身的文本(不含here-document的内容)"""
+            if len(unit) > 1 and self.matcher._HEREDOC_RE.search(unit[0]):
+                return unit[0]
+            return ''.join(unit)
+
+        def _pieces(self, text: str) -> Optional[List[Tuple[str, str, int, int]]]:
+            """把命令拆成依次出现的片段[(类型, 动作, 起点, 终点)]，并更新尚未结束的复合命令
+
+            类型'struct'为复合命令的关键字、条件、循环头或case模式，原样保留；'cmd'为简单命令；
+            'list'为含&&、||、管道或括号的命令，只能整体保留或删除。动作表示片段对分支的影响：
+            'open'进入复合命令，'block'进入复合命令并开始分支，'body'开始新的分支，
+            'next'结束当前分支，'close'结束复合命令。引号未闭合时返回None。
+            """
+            matcher = self.matcher
+            masked = matcher.mask(text)
+            if masked is None:
+                return None
+            tokens = [(match.group(), match.start(), match.end()) for match in matcher._TOKEN_RE.finditer(masked)]
+            frames = list(self._frames)
+            pieces = []
+            i = 0
+            while i < len(tokens):
+                word, start, _ = tokens[i]
+                if word in matcher._SEPARATORS:
+                    i += 1
+                    continue
+                if word in matcher._CASE_ENDS:
+                    if frames and frames[-1] == 'case-item':
+                        frames[-1] = 'case'
+                    pieces.append(('struct', 'next', start, tokens[i][2]))
+                    i += 1
+                    continue
+                if self.fish:
+                    step = self._fish_keyword(tokens, i, frames)
+                else:
+                    step = self._sh_keyword(tokens, i, frames)
+                if step is None:
+                    kind, end = self._command_end(tokens, i)
+                    if end == i:
+                        return None
+                    step = (kind, '', end, end)
+                kind, action, end, resume = step
+                pieces.append((kind, action, start, tokens[end - 1][2]))
+                i = resume
+            self._frames = frames
+            return pieces
+
+        def _sh_keyword(self, tokens: list, i: int, frames: list) -> Optional[Tuple[str, str, int, int]]:
+            """命令位置上的sh关键字，返回(类型, 动作, 片段结束的记号下标, 继续处理的下标)；不是关键字时返回None"""
+            word = tokens[i][0]
+            if frames and frames[-1] == 'case' and word != 'esac':
+                # case分支的模式，到第一个)为止
+                end = next((j for j in range(i, len(tokens)) if tokens[j][0] == ')'), None)
+                if end is None:
+                    return None
+                frames[-1] = 'case-item'
+                return 'struct', 'body', end + 1, end + 1
+            if word in ('then', 'do', 'else'):
+                return 'struct', 'body', i + 1, i + 1
+            if word == '{':
+                frames.append('{')
+                return 'struct', 'block', i + 1, i + 1
+            if word in ('if', 'while', 'until', 'for', 'select', 'elif'):
+                # 条件和循环头整体保留
+                if word != 'elif':
+                    frames.append(word)
+                end = self._segment_end(tokens, i)
+                return 'struct', 'next' if word == 'elif' else 'open', end, end
+            if word == 'case':
+                frames.append('case')
+                end = i + 1
+                while end < len(tokens) and tokens[end][0] != 'in' and tokens[end][0] not in self.matcher._SEPARATORS:
+                    end += 1
+                end = min(end + 1, len(tokens))
+                return 'struct', 'open', end, end
+            if word in ('fi', 'done', 'esac', '}'):
+                # 结束关键字之后的重定向一并保留
+                if frames:
+                    frames.pop()
+                end = self._segment_end(tokens, i)
+                return 'struct', 'close', end, end
+            if word == 'function' or (i + 2 < len(tokens) and tokens[i + 1][0] == '(' and tokens[i + 2][0] == ')'):
+                # 函数定义的头部，函数体的{在其后(可能在下一行)
+                end = min(i + 2, len(tokens)) if word == 'function' else i + 1
+                if end + 1 < len(tokens) and tokens[end][0] == '(' and tokens[end + 1][0] == ')':
+                    end += 2
+                return 'struct', '', end, end
+            return None
+
+        def _fish_keyword(self, tokens: list, i: int, frames: list) -> Optional[Tuple[str, str, int, int]]:
+            """命令位置上的fish关键字，返回值同_sh_keyword"""
+            word = tokens[i][0]
+            if word in ('if', 'while', 'for', 'function', 'switch'):
+                frames.append(word)
+                end = self._segment_end(tokens, i)
+                return 'struct', 'block', end, end
+            if word == 'begin':
+                frames.append(word)
+                return 'struct', 'block', i + 1, i + 1
+            if word in ('else', 'case'):
+                # else if和case的条件、模式与关键字一起保留
+                end = i + 1 if word == 'else' and (i + 1 >= len(tokens) or tokens[i + 1][0] != 'if') else \
+                    self._segment_end(tokens, i)
+                return 'struct', 'body', end, end
+            if word == 'end':
+                if frames:
+                    frames.pop()
+                end = self._segment_end(tokens, i)
+                return 'struct', 'close', end, end
+            return None
+
+        def _segment_end(self, tokens: list, i: int) -> int:
+            """从i开始到下一个不在括号内的命令分隔符为止"""
+            depth = 0
+            for j in range(i, len(tokens)):
+                word = tokens[j][0]
+                if depth == 0 and (word in self.matcher._SEPARATORS or word in self.matcher._CASE_ENDS):
+                    return j
+                if word == '(':
+                    depth += 1
+                elif word == ')' and depth:
+                    depth -= 1
+            return len(tokens)
+
+        def _command_end(self, tokens: list, i: int) -> Tuple[str, int]:
+            """一条命令的类型和结束位置；&&、||之后的{ ... }内的分隔符不结束命令"""
+            matcher = self.matcher
+            kind = 'cmd'
+            depth = braces = 0
+            command = False
+            j = i
+            while j < len(tokens):
+                word = tokens[j][0]
+                if not depth and not braces and (word in matcher._SEPARATORS or word in matcher._CASE_ENDS):
+                    break
+                if word == '(':
+                    depth += 1
+                    kind = 'list'
+                elif word == ')':
+                    if not depth:
+                        break
+                    depth -= 1
+                elif word in matcher._LIST_OPERATORS:
+                    kind = 'list'
+                elif command and word == '{':
+                    braces += 1
+                elif command and word == '}' and braces:
+                    braces -= 1
+                command = word in matcher._LIST_OPERATORS or word in matcher._SEPARATORS or word == '{'
+                j += 1
+            return kind, j
+
+        def _apply(self, units: list) -> List[str]:
+            """编辑一条顶层命令或一个完整的复合命令，返回输出的物理行
+
+            只删除引用了已删除安装的命令，条件、循环头和case模式原样保留；
+            某个分支的命令全部被删除时，在最后删除的位置写入空命令:，
+            使then/else/do/{ }等分支不为空(fish允许空的块，不需要补)。
+            """
+            frames = []
+            edits = {}
+            for u, (unit, pieces) in enumerate(units):
+                if pieces is None:
+                    # 无法解析的命令原样保留
+                    if frames and frames[-1] is not None:
+                        frames[-1][0] = frames[-1][1] = True
+                    continue
+                text = self._command_text(unit)
+                for p, (kind, action, start, end) in enumerate(pieces):
+                    if kind == 'struct':
+                        if action in ('body', 'next', 'close') and frames:
+                            self._close_branch(frames[-1], edits)
+                            if action == 'close':
+                                frames.pop()
+                            else:
+                                frames[-1] = [False, False, None] if action == 'body' else None
+                        elif action in ('open', 'block'):
+                            frames.append([False, False, None] if action == 'block' else None)
+                        continue
+                    # [有命令, 有保留的命令, 最后删除的片段]；顶层命令不需要补:
+                    branch = frames[-1] if frames else [False, False, None]
+                    if branch is None:
+                        # 条件部分(if与then之间等)的命令原样保留
+                        continue
+                    branch[0] = True
+                    if len(unit) > 1:
+                        # 多行命令只能整体删除
+                        edited = None if len(pieces) == 1 and self._references(text) else text
+                    else:
+                        edited = self._edit_command(text[start:end], kind)
+                    if edited is None:
+                        edits[(u, p)] = None
+                        branch[2] = (u, p)
+                        continue
+                    branch[1] = True
+                    if len(unit) == 1 and edited != text[start:end]:
+                        edits[(u, p)] = edited
+
+            out = []
+            for u, (unit, pieces) in enumerate(units):
+                if pieces is None or not any((u, p) in edits for p in range(len(pieces))):
+                    out.extend(unit)
+                    continue
+                self.changed += len(unit)
+                if len(unit) > 1:
+                    if edits[(u, 0)] is not None:
+                        first = unit[0]
+                        last = unit[-1]
+                        out.append(first[:len(first) - len(first.lstrip())] + edits[(u, 0)] + last[len(last.rstrip('\r\n')):])
+                    continue
+                line = self._rebuild(unit[0], pieces, [edits.get((u, p), unit[0][piece[2]:piece[3]])
+                                                       for p, piece in enumerate(pieces)])
+                if line is not None:
+                    out.append(line)
+            return out
+
+        def _close_branch(self, branch: Optional[list], edits: dict) -> None:
+            """分支结束：原有命令全部被删除时，把最后删除的命令换成:"""
+            if branch is not None and branch[0] and not branch[1] and branch[2] is not None and not self.fish:
+                edits[branch[2]] = ':'
+
+        def _edit_command(self, text: str, kind: str) -> Optional[str]:
+            """编辑单条命令，None表示删除"""
+            if kind == 'list':
+                return None if self._references(text) else text
+            return self._edit(text)
+
+        @staticmethod
+        def _rebuild(line: str, pieces: list, texts: List[Optional[str]]) -> Optional[str]:
+            """按编辑后的片段重新拼出一行，删除的片段连同其分隔符一起去掉；片段全部删除时返回None"""
+            if all(text is None for text in texts):
+                return None
+            items = []
+            for index, (piece, text) in enumerate(zip(pieces, texts)):
+                last = index + 1 == len(pieces)
+                gap = line[piece[3]:] if last else line[piece[3]:pieces[index + 1][2]]
+                if text is not None:
+                    items.append([text, gap])
+                elif not last and (';' in gap or '&' in gap):
+                    # 去掉命令和其后的分隔符
+                    continue
+                elif items:
+                    # 去掉命令和其前面的分隔符，保留行尾的注释和换行
+                    items[-1][1] = gap
+            return line[:pieces[0][2]] + ''.join(text + gap for text, gap in items)
+
+        def _release(self) -> List[str]:
+            pending, self._pending = self._pending or [], None
+            return pending
+
+        def _flush_block(self) -> List[str]:
+            block, self._block = self._block, None
+            if any(self._references(line) for line in block):
+                self.changed += len(block)
+                return []
+            return block
+
+        def _edit(self, line: str) -> Optional[str]:
+            """返回修改后的行，None表示删除该行"""
+            stripped = line.lstrip()
+            if not stripped or stripped.startswith('#'):
+                return line
+            body = line.rstrip('\r\n')
+            match = self.matcher._ASSIGN_RE.match(body) or self.matcher._FISH_SET_RE.match(body)
+            if match:
+                prefix, name, value, tail = match.groups()
+                fish = match.re is self.matcher._FISH_SET_RE
+                if name in self.matcher.PATH_VARS and '$(' not in value and '`' not in value:
+                    edited = self._edit_path_list(body, prefix, name, value, tail, fish)
+                    if edited is None:
+                        return None
+                    return line if edited == body else edited + line[len(body):]
+                expanded = self._expand(self._unquote(value))
+                if expanded and expanded.startswith('/') and expanded in self.matcher.removed:
+                    # 记住该变量，后续引用它的行同样视为引用了已删除的安装
+                    self.vars[name] = expanded
+                    return None
+                if expanded is not None:
+                    self.vars[name] = expanded
+            if self._references(line):
+                return None
+            return line
+
+        def _edit_path_list(self, body: str, prefix: str, name: str, value: str, tail: str,
+                            fish: bool) -> Optional[str]:
+            """从PATH类变量中去掉已删除安装内部的条目，返回不含换行的新行"""
+            quote = value[0] if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'' else ''
+            inner = value[1:-1] if quote else value
+            entries = [(entry, '') for entry in inner.split()] if fish else self._split_entries(inner)
+            if entries is None:
+                return body
+            kept = [(entry, kind) for entry, kind in entries if kind or not self._entry_removed(entry)]
+            if len(kept) == len(entries):
+                return body
+            # 只剩对自身的引用(如$PATH、${PATH:+:$PATH})时整行删除
+            if all(self._self_reference(entry, name) for entry, _ in kept):
+                return None
+            joined = ' '.join(entry for entry, _ in kept) if fish else self._join_entries(kept)
+            return f"{prefix}{name}{' ' if fish else '='}{quote}{joined}{quote}{tail}"
+
+        def _split_entries(self, value: str) -> Optional[List[Tuple[str, str]]]:
+            """按冒号拆分PATH值，${...}展开作为整体不拆开
+
+            返回[(条目, 类型)]：类型''为普通条目，'lead'/'trail'为自带前导/结尾分隔符的
+            ${NAME:+:...}/${NAME:+...:}条件展开；花括号不配对时返回None。
+            """
+            entries = []
+            current = ''
+            i = 0
+            while i < len(value):
+                if value.startswith('${', i):
+                    end = self._brace_end(value, i + 1)
+                    if end < 0:
+                        return None
+                    token = value[i:end + 1]
+                    i = end + 1
+                    conditional = self.matcher._CONDITIONAL_RE.match(token)
+                    if conditional and conditional.group(3).startswith(':'):
+                        if current:
+                            entries.append((current, ''))
+                            current = ''
+                        entries.append((token, 'lead'))
+                    elif conditional and conditional.group(3).endswith(':') and not current:
+                        entries.append((token, 'trail'))
+                    else:
+                        current += token
+                    continue
+                if value[i] == ':':
+                    # 条件展开已经带有分隔符
+                    if current or not (entries and entries[-1][1]):
+                        entries.append((current, ''))
+                    current = ''
+                else:
+                    current += value[i]
+                i += 1
+            if current or (value.endswith(':') and not (entries and entries[-1][1])):
+                entries.append((current, ''))
+            return entries
+
+        @staticmethod
+        def _brace_end(value: str, start: int) -> int:
+            depth = 0
+            for i in range(start, len(value)):
+                if value[i] == '{':
+                    depth += 1
+                elif value[i] == '}':
+                    depth -= 1
+                    if depth == 0:
+                        return i
+            return -1
+
+        def _join_entries(self, entries: List[Tuple[str, str]]) -> str:
+            """重新拼接条目；条件展开移到开头或结尾时调整其分隔符的位置，避免展开出空条目"""
+            entries = list(entries)
+            first, last = entries[0], entries[-1]
+            if first[1] == 'lead':
+                name, op, alt = self.matcher._CONDITIONAL_RE.match(first[0]).groups()
+                alt = alt[1:]
+                entries[0] = (f"${{{name}{op}{alt}:}}", 'trail') if len(entries) > 1 else (f"${{{name}{op}{alt}}}", '')
+            if len(entries) > 1 and last[1] == 'trail':
+                name, op, alt = self.matcher._CONDITIONAL_RE.match(last[0]).groups()
+                entries[-1] = (f"${{{name}{op}:{alt[:-1]}}}", 'lead')
+            joined = ''
+            for index, (entry, kind) in enumerate(entries):
+                if index and kind != 'lead' and entries[index - 1][1] != 'trail':
+                    joined += ':'
+                joined += entry
+            return joined
+
+        def _self_reference(self, entry: str, name: str) -> bool:
+            entry = entry.strip('"\'')
+            if entry in (f'${name}', f'${{{name}}}', ''):
+                return True
+            conditional = self.matcher._CONDITIONAL_RE.match(entry)
+            return bool(conditional) and conditional.group(1) == name
+
+        def _entry_removed(self, entry: str) -> bool:
+            expanded = self._expand(entry.strip('"\''))
+            return bool(expanded) and expanded.startswith('/') and expanded in self.matcher.removed
+
+        def _references(self, line: str) -> bool:
+            """行中是否有指向已删除安装内部的路径或变量"""
+            if line.lstrip().startswith('#'):
+                return False
+            for token in self.matcher._PATH_TOKEN_RE.findall(line):
+                expanded = self._expand(token)
+                if expanded and expanded.startswith('/') and expanded in self.matcher.removed:
+                    return True
+            return False
+
+        def _expand(self, value: str) -> Optional[str]:
+            """展开~和已知变量；含未知变量时返回None"""
+            if value.startswith('~'):
+                home = self.vars.get('HOME')
+                if not home:
+                    return None
+                value = home + value[1:]
+            unknown = []
+
+            def substitute(match):
+                known = self.vars.get(match.group(1))
+                if known is None:
+                    unknown.append(match.group(1))
+                    return ''
+                return known
+
+            value = self.matcher._VAR_RE.sub(substitute, value)
+            return None if unknown else value
+
+        @staticmethod
+        def _unquote(value: str) -> str:
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+                return value[1:-1]
+            return value
+
+class RcRewriter:
+    """环境文件改写器(Python和Java清理共用)
+
+    每个文件只顺序读取一次，所有匹配规则在同一遍中应用；没有需要修改的行时不备份也不写入。
+    修改先写入同目录的临时文件，再用os.replace原子替换，中途失败不会留下截断的文件。
+    备份以原内容的sha256命名，重复运行不会堆积相同的副本；内容相同的文件共用一个备份，
+    每次改写都在备份目录的manifest.jsonl中追加一行{备份, 原文件绝对路径, 符号链接, 时间}。
+    """
+
+    MANIFEST_NAME = 'manifest.jsonl'
+
+    def __init__(self, backup_dir: str = RC_BACKUP_DIR):
+        self.backup_dir = backup_dir
+        # 多个线程共用同一个改写器，备份目录只确定一次
+        self._lock = threading.Lock()
+        self._backup_ready = False
+
+    def manifest_path(self) -> str:
+        return os.path.join(self.backup_dir, self.MANIFEST_NAME)
+
+    def rewrite(self, path: str, matcher: RcMatcher, home: Optional[str] = None) -> Tuple[int, Optional[str]]:
+        """按matcher删除或修改行，返回(删除或修改的行数, 备份路径)；文件未变化时返回(0, None)
+
+        home不为None时path属于该用户：真实路径离开主目录或文件属主不是主目录属主时拒绝改写，
+        以免root顺着用户创建的符号链接改写(并改变属主)主目录以外的文件。
+        """
+        # dotfiles管理工具常把rc文件做成符号链接，改写链接指向的真实文件
+        real = os.path.realpath(path)
+        if home is not None:
+            self._check_user_file(real, home)
+        digest = hashlib.sha256()
+        editor = matcher.editor(home, fish=real.endswith('.fish'))
+        original = []
+        kept = []
+        with open(real, 'rb') as f:
+            st = os.fstat(f.fileno())
+            if home is not None and st.st_uid != os.stat(home).st_uid:
+                raise PermissionError(f"文件属主(uid {st.st_uid})与主目录属主不同，跳过")
+            for line in f:
+                digest.update(line)
+                original.append(line)
+                # surrogateescape保证非UTF-8内容原样写回
+                kept.extend(editor.feed(line.decode('utf-8', errors='surrogateescape')))
+        kept.extend(editor.finish())
+        removed = editor.changed
+        if not removed:
+            return 0, None
+        kept = [line.encode('utf-8', errors='surrogateescape') for line in kept]
+
+        backup = self._backup(real, digest.hexdigest(), original, st)
+        self._record(backup, real, path)
+        fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(real) + '.', dir=os.path.dirname(real))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.writelines(kept)
+                f.flush()
+                os.fsync(f.fileno())
+                os.fchmod(f.fileno(), stat.S_IMODE(st.st_mode))
+                try:
+                    os.fchown(f.fileno(), st.st_uid, st.st_gid)
+                except PermissionError:
+                    pass
+            os.replace(tmp, real)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return removed, backup
+
+    @staticmethod
+    def _check_user_file(real: str, home: str) -> None:
+        """用户的环境文件解析后必须仍在其主目录内"""
+        real_home = os.path.realpath(home)
+        if os.path.commonpath([real, real_home]) != real_home:
+            raise PermissionError(f"真实路径 {real} 不在主目录 {real_home} 内，跳过")
+
+    def _backup_dir(self) -> str:
+        with self._lock:
+            if not self._backup_ready:
+                try:
+                    os.makedirs(self.backup_dir, mode=0o700, exist_ok=True)
+                except PermissionError:
+                    # 普通用户无法写入/var/cache时改用自己的缓存目录
+                    self.backup_dir = os.path.expanduser('~/.cache/airuninstaller/rc-backups')
+                    os.makedirs(self.backup_dir, mode=0o700, exist_ok=True)
+                self._backup_ready = True
+            return self.backup_dir
+
+    def _record(self, backup: str, real: str, path: str) -> None:
+        """在清单中记录备份对应的原文件，备份名本身无法区分不同用户的同名文件"""
+        entry = {'backup': backup, 'original': os.path.abspath(real), 'time': time.time()}
+        if os.path.abspath(path) != entry['original']:
+            entry['link'] = os.path.abspath(path)
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8', errors='surrogateescape')
+        with self._lock:
+            # 整行一次写入O_APPEND文件，多个进程同时运行也不会交错
+            fd = os.open(self.manifest_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def _backup(self, path: str, digest: str, content: List[bytes], st: os.stat_result) -> str:
+        """按内容哈希保存读取到的原内容；相同内容已有备份时直接复用
+
+        内容相同的文件(如多个用户从skel复制的.bashrc)可能在不同线程中同时备份，
+        各自写入独立的临时文件再原子改名，目标已存在即视为成功。
+        """
+        directory = self._backup_dir()
+        backup = os.path.join(directory, f"{digest[:16]}-{os.path.basename(path).lstrip('.')}")
+        if os.path.exists(backup):
+            return backup
+        fd, tmp = tempfile.mkstemp(prefix='.backup.', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.writelines(content)
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.replace(tmp, backup)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return backup
+
+class TrashStore:
+    """延迟删除：安装先原子改名移入同一文件系统上的回收目录，真正的删除稍后在后台低优先级执行
+
+    回收目录优先放在挂载点下；挂载点不可写(普通用户的根文件系统)时，
+    若主目录与安装位于同一文件系统，则使用主目录下的回收目录。
+    """
+
+    def __init__(self, dir_name: str = TRASH_DIR_NAME):
+        self.dir_name = dir_name
+        self._mounts = {}
+
+    def stash(self, path: str) -> Optional[str]:
+        """把path改名移入回收目录，返回新路径；无法在同一文件系统内改名时返回None"""
+        try:
+            dev = os.lstat(path).st_dev
+        except OSError:
+            return None
+        trash = self._trash_dir(path, dev)
+        if trash is None:
+            return None
+
+        target = self._unique_target(trash, path)
+        try:
+            os.rename(path, target)
+        except OSError:
+            return None
+        return target
+
+    def _unique_target(self, trash: str, path: str) -> str:
+        """在回收目录中为path生成一个尚不存在的条目名"""
+        base = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{os.path.basename(path.rstrip('/'))}"
+        target = os.path.join(trash, base)
+        suffix = 1
+        # rename会静默替换空目录，必须先确认目标不存在
+        while os.path.lexists(target):
+            target = os.path.join(trash, f"{base}.{suffix}")
+            suffix += 1
+        return target
+
+    def _trash_dir(self, path: str, dev: int) -> Optional[str]:
+        """取得与path同一文件系统的回收目录，必要时创建"""
+        if dev in self._mounts:
+            return self._mounts[dev]
+        candidates = [self._mount_point(path, dev), os.path.expanduser('~')]
+        trash = None
+        for base in candidates:
+            try:
+                if os.stat(base).st_dev != dev:
+                    continue
+                candidate = os.path.join(base, self.dir_name)
+                os.makedirs(candidate, mode=0o700, exist_ok=True)
+                if os.access(candidate, os.W_OK):
+                    trash = candidate
+                    break
+            except OSError:
+                continue
+        self._mounts[dev] = trash
+        return trash
+
+    def _mount_point(self, path: str, dev: int) -> str:
+        """向上查找st_dev不变的最高一级目录，即所在文件系统的挂载点"""
+        current = os.path.dirname(os.path.abspath(path))
+        while current != '/':
+            parent = os.path.dirname(current)
+            try:
+                if os.stat(parent).st_dev != dev:
+                    break
+            except OSError:
+                break
+            current = parent
+        return current
+
+    def trash_dirs(self) -> List[str]:
+        """所有已存在的回收目录(各挂载点及各用户主目录下)"""
+        bases = {'/', os.path.expanduser('~')}
+        try:
+            with open('/proc/self/mounts', 'r') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 2:
+                        bases.add(re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[1]))
+        except OSError:
+            pass
+        bases.update(glob.glob('/home/*'))
+        return sorted(path for path in (os.path.join(base, self.dir_name) for base in bases) if os.path.isdir(path))
+
+    @staticmethod
+    def lower_priority() -> None:
+        """把当前进程的CPU和I/O优先级降到最低(idle I/O调度类)"""
+        try:
+            os.nice(19)
+        except OSError:
+            pass
+        ionice = shutil.which('ionice')
+        if ionice:
+            subprocess.run([ionice, '-c', '3', '-p', str(os.getpid())],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def purge(self, engine: 'RemovalEngine') -> Dict[str, dict]:
+        """清空所有回收目录，返回删除引擎的结果；同一时间只有一个进程在清理"""
+        reports = {}
+        for trash in self.trash_dirs():
+            try:
+                fd = os.open(trash, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                # 阻塞等待正在进行的清理结束，再清理之后新移入的条目
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                while True:
+                    entries = [os.path.join(trash, name) for name in os.listdir(trash)]
+                    if not entries:
+                        break
+                    batch = engine.remove([(entry, 0) for entry in entries])
+                    reports.update(batch)
+                    if any(report['failures'] for report in batch.values()):
+                        break
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+        return reports
+
+    @staticmethod
+    def spawn_purge() -> None:
+        """在独立会话中启动后台清理进程，不等待其结束"""
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'purge'],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+
+class QuarantineStore(TrashStore):
+    """隔离区：移除的安装整体保存，附带清单，可以原样恢复
+
+    同一文件系统内用rename移入(恢复时同样只需一次rename)；
+    跨btrfs子卷等无法rename的情况，用FICLONE逐文件reflink复制到主目录下的隔离区，
+    不复制数据块。两种方式都不可用时保留原安装，不做删除。
+    """
+
+    # linux/fs.h: _IOW(0x94, 9, int)
+    FICLONE = 0x40049409
+
+    def __init__(self, retention_days: float = QUARANTINE_RETENTION_DAYS):
+        super().__init__(QUARANTINE_DIR_NAME)
+        self.retention = retention_days * 86400
+
+    def quarantine(self, install: Installation, engine: 'RemovalEngine', aliases: Iterable[str] = ()) -> Optional[dict]:
+        """把安装移入隔离区并写入清单，返回清单；无法隔离时返回None
+
+        aliases为指向该安装(及其内部安装)的别名，条目过期删除时据此清理别名链接、环境文件和alternatives。
+        """
+        path = install['path']
+        try:
+            dev = os.lstat(path).st_dev
+        except OSError:
+            return None
+
+        trash = self._trash_dir(path, dev)
+        method = 'rename'
+        if trash is not None:
+            target = self._unique_target(trash, path)
+            try:
+                os.rename(path, target)
+            except OSError:
+                trash = None
+        if trash is None:
+            trash = os.path.join(os.path.expanduser('~'), self.dir_name)
+            target = self._unique_target(trash, path)
+            method = 'reflink'
+            try:
+                os.makedirs(trash, mode=0o700, exist_ok=True)
+                self._clone_tree(path, target)
+            except OSError:
+                engine.remove([(target, 0)])
+                return None
+            # 原安装即使未能完全删除，隔离区中的完整副本仍然保留以便恢复
+            engine.remove([(path, install['size'])])
+
+        manifest = {
+            'id': os.path.basename(target),
+            'original': path,
+            'stored': target,
+            'method': method,
+            'time': time.time(),
+            'type': install['type'],
+            'version': install['version'],
+            'source': install['source'],
+            'size': install['size'],
+            'aliases': sorted(set(aliases)),
+        }
+        self._write_manifest(manifest)
+        return manifest
+
+    def _clone_tree(self, src: str, dst: str) -> None:
+        """用FICLONE复制整棵目录树(只共享数据块，不复制数据)，不支持时抛出OSError"""
+        st = os.lstat(src)
+        if stat.S_ISLNK(st.st_mode):
+            os.symlink(os.readlink(src), dst)
+            return
+        if stat.S_ISDIR(st.st_mode):
+            os.mkdir(dst, 0o700)
+            with os.scandir(src) as it:
+                for entry in it:
+                    self._clone_tree(entry.path, os.path.join(dst, entry.name))
+        elif stat.S_ISREG(st.st_mode):
+            src_fd = os.open(src, os.O_RDONLY | os.O_NOFOLLOW)
+            try:
+                dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                try:
+                    fcntl.ioctl(dst_fd, self.FICLONE, src_fd)
+                finally:
+                    os.close(dst_fd)
+            finally:
+                os.close(src_fd)
+        else:
+            raise OSError(f"不支持的文件类型: {src}")
+        shutil.copystat(src, dst, follow_symlinks=False)
+
+    def _write_manifest(self, manifest: dict) -> None:
+        """清单与条目放在一起(条目名.json)，先写临时文件再替换"""
+        path = manifest['stored'] + '.json'
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def entries(self) -> List[dict]:
+        """所有隔离区条目的清单，按时间从新到旧"""
+        manifests = []
+        for trash in self.trash_dirs():
+            for path in glob.glob(os.path.join(trash, '*.json')):
+                try:
+                    with open(path, 'r') as f:
+                        manifests.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(manifests, key=lambda manifest: manifest.get('time', 0), reverse=True)
+
+    def restore(self, key: str, engine: 'RemovalEngine') -> Tuple[Optional[dict], str]:
+        """按条目id或原路径恢复最近的一个条目，返回(清单, 说明)"""
+        for manifest in self.entries():
+            if key in (manifest['id'], manifest['original']):
+                break
+        else:
+            return None, "隔离区中没有该条目"
+
+        original, stored = manifest['original'], manifest['stored']
+        if os.path.lexists(original):
+            return manifest, f"原路径已存在: {original}"
+        os.makedirs(os.path.dirname(original), exist_ok=True)
+        try:
+            os.rename(stored, original)
+        except OSError:
+            # reflink复制的条目位于其他子卷，同样以reflink复制回去
+            try:
+                self._clone_tree(stored, original)
+            except OSError as e:
+                engine.remove([(original, 0)])
+                return manifest, f"恢复失败: {str(e)}"
+            engine.remove([(stored, 0)])
+        os.unlink(stored + '.json')
+        return manifest, "已恢复"
+
+    def expire(self, engine: 'RemovalEngine') -> List[dict]:
+        """删除超过保留期限的条目，返回已删除条目的清单"""
+        cutoff = time.time() - self.retention
+        expired = []
+        for manifest in self.entries():
+            if manifest.get('time', 0) >= cutoff:
+                continue
+            reports = engine.remove([(manifest['stored'], manifest.get('size', 0))])
+            if any(report['failures'] for report in reports.values()):
+                continue
+            try:
+                os.unlink(manifest['stored'] + '.json')
+            except OSError:
+                pass
+            expired.append(manifest)
+        return expired
+
+class BlockArchiver:
+    """把安装流式写入.tar.xz/.tar.gz归档
+
+    tar数据按块写成首尾相接的多个xz流/gzip成员(标准工具可以直接解压)，
+    每个文件只读取一次，直接送入压缩器，不经过临时副本。
+    清单记录每个块的压缩偏移和每个文件所在的块，取出单个文件时只需从该块开始解压。
+    """
+
+    SUFFIXES = {'xz': '.tar.xz', 'gz': '.tar.gz'}
+
+    class _Sink:
+        """tarfile的输出对象：写入当前块的压缩器，并记录块边界"""
+
+        def __init__(self, out, fmt: str):
+            self.out = out
+            self.fmt = fmt
+            self.offset = 0
+            self.blocks = []
+            self._compressor = None
+
+        def new_block(self) -> None:
+            """结束当前压缩流，从当前位置开始一个新的流"""
+            self._finish()
+            self.blocks.append((self.out.tell(), self.offset))
+            if self.fmt == 'xz':
+                self._compressor = lzma.LZMACompressor(format=lzma.FORMAT_XZ)
+            else:
+                self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+        def write(self, data: bytes) -> int:
+            self.out.write(self._compressor.compress(data))
+            self.offset += len(data)
+            return len(data)
+
+        def tell(self) -> int:
+            return self.offset
+
+        def _finish(self) -> None:
+            if self._compressor is not None:
+                self.out.write(self._compressor.flush())
+                self._compressor = None
+
+        def close(self) -> None:
+            self._finish()
+
+    def __init__(self, fmt: str = 'xz', block_size: int = ARCHIVE_BLOCK_SIZE):
+        self.fmt = fmt
+        self.block_size = block_size
+
+    def write(self, source: str, archive: str) -> dict:
+        """把source整棵树写入archive，并在archive.manifest.json写入清单，返回清单"""
+        members = []
+        with open(archive, 'wb') as out:
+            sink = self._Sink(out, self.fmt)
+            sink.new_block()
+            tar = tarfile.open(fileobj=sink, mode='w', format=tarfile.PAX_FORMAT)
+            base = os.path.dirname(source.rstrip('/'))
+            for path in self._walk(source):
+                # 块只在文件边界切换，保证每个文件的头和数据从同一个块开始
+                if sink.offset - sink.blocks[-1][1] >= self.block_size:
+                    sink.new_block()
+                info_offset = tar.offset
+                info = tar.gettarinfo(path, os.path.relpath(path, base))
+                if info.isreg():
+                    with open(path, 'rb') as f:
+                        tar.addfile(info, f)
+                else:
+                    tar.addfile(info)
+                members.append((info.name, info.size, info_offset, len(sink.blocks) - 1))
+            tar.close()
+            sink.close()
+
+        manifest = {
+            'archive': os.path.basename(archive),
+            'source': source,
+            'format': self.fmt,
+            # [压缩文件中的偏移, tar流中的偏移]
+            'blocks': sink.blocks,
+            # [tar中的路径, 文件大小, tar流中文件头的偏移, 所在块]
+            'members': members,
+        }
+        with open(archive + '.manifest.json', 'w') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        return manifest
+
+    def _walk(self, source: str):
+        """按目录顺序列出source下的所有路径(不跟随符号链接)"""
+        yield source
+        if not os.path.isdir(source) or os.path.islink(source):
+            return
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(dirs) + sorted(files):
+                yield os.path.join(root, name)
+
+def _archive_installation(source: str, archive: str, fmt: str) -> Tuple[str, Optional[str], int, str]:
+    """归档进程池中执行的任务，返回(安装路径, 归档路径或None, 文件数, 错误信息)"""
+    try:
+        manifest = BlockArchiver(fmt).write(source, archive)
+        return source, archive, len(manifest['members']), ''
+    except Exception as e:
+        for path in (archive, archive + '.manifest.json'):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        return source, None, 0, str(e)
+
 class PythonUninstaller(SystemCleaner):
-    def __init__(self):
-        super().__init__()
-        self.installations = []
+    def __init__(self, options: Optional[argparse.Namespace] = None):
+        super().__init__(options)
+        self.installations = InstallationRegistry()
+        self.version_resolver = PythonVersionResolver()
         # Linux下Python常见安装路径
         self.patterns = [
             ('/usr/bin/python*', "系统Python"),
             ('/usr/local/bin/python*', "用户编译安装Python"),
             ('/opt/python*', "自定义安装Python"),
             ('/home/*/.local/bin/python*', "用户本地Python"),
-            ('/home/*/.pyenv/*', "pyenv环境"),
             ('/home/*/.virtualenvs/*', "虚拟环境"),
             ('/home/*/anaconda*', "Anaconda"),
             ('/home/*/miniconda*', "Miniconda")
         ]
 
-    def detect_installations(self) -> List[Dict[str, str]]:
+    def detect_installations(self) -> InstallationRegistry:
         """检测所有Python安装"""
+        self._open_index()
         self._check_standard_installs()
+        self._check_toolchains()
         self._check_virtualenvs()
         self._check_conda_envs()
+        self._run_probes()
+        if self.index is not None:
+            self.index.commit()
+        self._report_memory(self.installations.copy())
         return self.installations
 
     def _check_standard_installs(self) -> None:
         """检查标准安装路径"""
+        hits = self._expand_patterns([pattern for pattern, _ in self.patterns])
         for pattern, desc in self.patterns:
-            for path in glob.glob(pattern):
+            for path in hits[pattern]:
                 if os.path.exists(path):
                     self._validate_python_path(path, desc)
 
     def _validate_python_path(self, path: str, source: str) -> None:
         """验证是否为有效的Python安装"""
-        # 如果是符号链接，获取真实路径
-        if os.path.islink(path):
-            path = os.path.realpath(path)
+        # 统一以真实路径登记，经符号链接或绑定挂载到达的路径记为别名
+        alias = path
+        path = os.path.realpath(path)
+        existing = self.installations.find(path)
+        if existing is not None:
+            self.installations.add_alias(existing, alias)
+            return
         
-        # 如果是可执行文件
+        # 如果是可执行文件(python3-config等脚本不是解释器)
         if os.path.isfile(path) and os.access(path, os.X_OK):
-            version = self._get_python_version(path)
+            if not PythonVersionResolver.is_interpreter(path):
+                return
+
             install_type = self._determine_install_type(path)
-            
-            if not any(install['path'] == path for install in self.installations):
-                self.installations.append({
-                    'path': path,
-                    'version': version,
-                    'type': install_type,
-                    'source': source,
-                    'executable': path
-                })
-                self.log(f"发现: {install_type} {version} @ {path} ({source})")
+            install = Installation(
+                path=path,
+                version=PROBE_PENDING,
+                type=install_type,
+                source=source,
+                executable=path,
+                package=self._package_index().owner(path) or ''
+            )
+            self._resolve_python_version(install)
+            self.installations.add(install, alias)
+            self.log(f"发现: {install_type} {install['version']} @ {path} ({source})")
         
         # 如果是目录
         elif os.path.isdir(path):
             python_bin = os.path.join(path, 'bin', 'python')
-            if os.path.exists(python_bin):
-                version = self._get_python_version(python_bin)
+            if os.path.exists(python_bin) and PythonVersionResolver.is_interpreter(python_bin):
                 install_type = self._determine_install_type(path)
-                
-                if not any(install['path'] == path for install in self.installations):
-                    self.installations.append({
-                        'path': path,
-                        'version': version,
-                        'type': install_type,
-                        'source': source,
-                        'executable': python_bin
-                    })
-                    self.log(f"发现: {install_type} {version} @ {path} ({source})")
-
-    def _get_python_version(self, python_path: str) -> str:
-        """获取Python版本"""
+                install = Installation(
+                    path=path,
+                    version=PROBE_PENDING,
+                    type=install_type,
+                    source=source,
+                    executable=python_bin,
+                    package=self._package_index().owner(path) or ''
+                )
+                self._resolve_python_version(install)
+                self.installations.add(install, alias)
+                self.log(f"发现: {install_type} {install['version']} @ {path} ({source})")
+
+    def _resolve_python_version(self, install: Installation) -> None:
+        """获取Python版本：优先读取安装元数据，无法确定时排队启动解释器探测"""
+        executable = install['executable']
+        version = self.version_resolver.resolve(executable)
+        if version:
+            install['version'] = f"Python {version}"
+            return
+        self.probes.submit(
+            install, 'version',
+            lambda: self._memo('python-version', executable, self._probe_python_version)
+        )
+
+    def _probe_python_version(self, python_path: str) -> str:
+        """启动解释器获取版本(带超时)；超时或失败时抛出ProbeError，结果不会被缓存"""
         try:
             result = subprocess.run(
                 [python_path, '--version'],
                 capture_output=True,
-                text=True
+                text=True,
+                timeout=PROBE_TIMEOUT
             )
-            return result.stdout.strip() or result.stderr.strip()
+        except subprocess.TimeoutExpired:
+            raise ProbeError(f"版本获取超时({PROBE_TIMEOUT}秒)")
         except Exception as e:
-            return f"版本获取失败: {str(e)}"
+            raise ProbeError(f"版本获取失败: {str(e)}")
+        output = result.stdout.strip() or result.stderr.strip()
+        if result.returncode != 0 or not output.startswith('Python'):
+            raise ProbeError(f"版本获取失败: {output or f'退出码 {result.returncode}'}")
+        return output
 
     def _determine_install_type(self, path: str) -> str:
-        """判断安装类型"""
+        """判断安装类型：属于软件包的为系统Python，其余按路径特征判断"""
+        index = self._package_index()
+        if index.owner(path):
+            return '系统Python'
         path_lower = path.lower()
         if 'conda' in path_lower or 'anaconda' in path_lower:
             return 'Conda'
@@ -127,44 +3353,49 @@ class PythonUninstaller(SystemCleaner):
             return 'Virtualenv'
         if '.local' in path_lower or '.pyenv' in path_lower:
             return '用户安装'
-        if '/usr/bin' in path_lower:
+        # 没有包数据库(如Arch)时只能按位置推断
+        if not index.available and '/usr/bin' in path_lower:
             return '系统Python'
         return '自定义安装'
 
+    def _check_toolchains(self) -> None:
+        """检测pyenv、uv、asdf、mise和pipx管理的Python"""
+        self.log("\n扫描工具链管理器...")
+        for prefix, manager, source in PythonToolchainDetector().discover(self._user_homes()):
+            self._validate_python_path(prefix, source)
+            install = self.installations.find(prefix)
+            if install is not None and not install['manager']:
+                install['manager'] = sys.intern(manager)
+
     def _check_virtualenvs(self) -> None:
         """检测虚拟环境"""
         self.log("\n扫描虚拟环境...")
-        search_paths = [
-            os.path.expanduser('~'),
-            '/opt',
-            '/usr/local'
-        ]
+        for path in self._scan_hits('python-venv'):
+            self._validate_python_path(path, '虚拟环境')
+
+    def register_detectors(self, engine: ScanEngine) -> None:
+        """注册虚拟环境匹配器"""
+        engine.register('python-venv', self._match_virtualenv)
 
-        for search_path in search_paths:
-            for root, dirs, _ in os.walk(search_path):
-                if 'pyvenv.cfg' in dirs or 'bin/python' in dirs:
-                    self._validate_python_path(root, '虚拟环境')
-                for dir_name in dirs:
-                    if dir_name.lower() in ('venv', 'virtualenv', '.venv'):
-                        self._validate_python_path(os.path.join(root, dir_name), '虚拟环境')
+    def _match_virtualenv(self, root: str, dirs: list, files: list) -> List[str]:
+        """在单个目录中查找虚拟环境候选路径(由遍历线程调用)"""
+        # 标准虚拟环境的根目录含有pyvenv.cfg文件
+        if any(entry.name == 'pyvenv.cfg' for entry in files):
+            # 虚拟环境内部不会再嵌套虚拟环境，无需继续深入
+            dirs.clear()
+            return [root]
+        # 旧版virtualenv创建的环境没有pyvenv.cfg，按常见目录名识别，由_validate_python_path确认
+        return [entry.path for entry in dirs if entry.name.lower() in ('venv', 'virtualenv', '.venv')]
 
     def _check_conda_envs(self) -> None:
         """检测Conda环境"""
         self.log("\n扫描Conda环境...")
-        conda_paths = [
-            os.path.expanduser('~/anaconda3'),
-            os.path.expanduser('~/miniconda3'),
-            '/opt/anaconda3',
-            '/opt/miniconda3'
-        ]
+        for prefix, source in CondaDetector().discover(self._user_homes()):
+            self._validate_python_path(prefix, source)
 
-        for conda_path in conda_paths:
-            if os.path.exists(conda_path):
-                self._validate_python_path(conda_path, 'Conda')
-                envs_path = os.path.join(conda_path, 'envs')
-                if os.path.exists(envs_path):
-                    for env in os.listdir(envs_path):
-                        self._validate_python_path(os.path.join(envs_path, env), 'Conda环境')
+    def planned_removals(self) -> list:
+        """将被删除的安装(系统Python交给包管理器，不在计划内)"""
+        return [install for install in self.installations if install['type'] != '系统Python']
 
     def uninstall(self) -> None:
         """执行卸载操作"""
@@ -175,159 +3406,248 @@ class PythonUninstaller(SystemCleaner):
         self.log("\n=== 开始卸载Python ===")
         self._remove_installation_files()
         self._clean_environment()
+        self.log("\n从alternatives系统中移除Python...")
+        self._remove_alternatives(self.cleanup)
         self.log("\n=== Python卸载完成 ===")
 
     def _remove_installation_files(self) -> None:
         """删除Python安装文件"""
         self.log("\n删除Python安装文件...")
+        planned = []
         for install in self.installations:
-            path = install['path']
-            
             # 如果是系统Python，提示不要删除
             if install['type'] == '系统Python':
-                self.log(f"警告: 跳过系统Python {path} - 请使用系统包管理器卸载")
+                self.log(f"警告: 跳过系统Python {install['path']} - {self._package_advice(install)}")
                 continue
-            
-            try:
-                if os.path.isfile(path):
-                    os.remove(path)
-                    self.log(f"已删除文件: {path}")
-                elif os.path.isdir(path):
-                    shutil.rmtree(path)
-                    self.log(f"已删除目录: {path}")
-            except Exception as e:
-                self.log(f"删除失败 {path}: {str(e)}")
+            planned.append(install)
+        self.removed = self._remove_paths(planned)
 
     def _clean_environment(self) -> None:
-        """清理环境变量"""
+        """清理环境变量(只针对实际删除的安装，被保留的安装的配置不受影响)"""
         self.log("\n清理Python环境变量...")
-        # 获取当前用户的环境文件
-        env_files = [
-            os.path.expanduser('~/.bashrc'),
-            os.path.expanduser('~/.bash_profile'),
-            os.path.expanduser('~/.zshrc'),
-            os.path.expanduser('~/.profile'),
-            '/etc/environment'
-        ]
-
-        for env_file in env_files:
-            if os.path.exists(env_file):
-                try:
-                    # 备份原文件
-                    shutil.copy2(env_file, env_file + '.bak')
-                    
-                    # 读取内容并过滤Python相关环境变量
-                    with open(env_file, 'r') as f:
-                        lines = f.readlines()
-                    
-                    new_lines = []
-                    for line in lines:
-                        if not any(keyword in line for keyword in ['PYTHON', 'CONDA', 'ANACONDA']):
-                            new_lines.append(line)
-                    
-                    # 写入新内容
-                    with open(env_file, 'w') as f:
-                        f.writelines(new_lines)
-                    
-                    self.log(f"已清理环境文件: {env_file}")
-                except Exception as e:
-                    self.log(f"清理环境文件失败 {env_file}: {str(e)}")
+        self._rewrite_env_files(self.cleanup)
 
     def verify_uninstall(self) -> bool:
-        """验证卸载是否成功"""
+        """验证卸载是否成功：对照删除计划复查，不重新检测"""
         self.log("\n=== 验证Python卸载结果 ===")
-        original_installations = self.installations.copy()
-        self.installations = []
-        self.detect_installations()
-
-        if not self.installations:
-            self.log("所有Python安装已成功移除")
-            return True
-
-        self.log("\n以下Python安装未被完全移除:")
-        for install in self.installations:
-            self.log(f"- {install['type']} {install['version']} @ {install['path']}")
-
-        self.installations = original_installations
-        return False
+        return self._verify_planned('Python')
 
 class JavaUninstaller(SystemCleaner):
-    def __init__(self):
-        super().__init__()
-        self.java_installations = []
+    # 应用程序目录的标志文件(JetBrains IDE和Android Studio、Eclipse)，其中自带的Java运行时随应用一起管理
+    APP_MARKERS = ('product-info.json', 'build.txt', '.eclipseproduct', 'eclipse.ini')
+
+    def __init__(self, options: Optional[argparse.Namespace] = None):
+        super().__init__(options)
+        self.java_installations = InstallationRegistry()
+        # jenv、SDKMAN等管理器中指向JDK的符号链接，卸载后清理悬空的链接
+        self.manager_links = set()
         # Linux下Java常见安装路径
         self.java_patterns = [
             ('/usr/lib/jvm/*', "系统Java"),
             ('/usr/java/*', "Oracle Java"),
             ('/opt/jdk*', "自定义JDK"),
             ('/opt/java*', "自定义Java"),
-            ('/home/*/.sdkman/candidates/java/*', "SDKMAN安装"),
             ('/home/*/.local/share/umake/java/*', "Ubuntu Make安装")
         ]
 
-    def find_java_installations(self) -> List[Dict[str, str]]:
+    def find_java_installations(self) -> InstallationRegistry:
         """检测所有Java安装"""
+        self._open_index()
         self._check_standard_installs()
+        self._check_toolchains()
+        self._check_scanned_java_homes()
         self._check_alternatives()
         self._check_environment_paths()
+        self._run_probes()
+        if self.index is not None:
+            self.index.commit()
+        self._report_memory(self.java_installations.copy())
         return self.java_installations
 
     def _check_standard_installs(self) -> None:
         """检查标准安装路径"""
+        hits = self._expand_patterns([pattern for pattern, _ in self.java_patterns])
         for pattern, desc in self.java_patterns:
-            for path in glob.glob(pattern):
+            for path in hits[pattern]:
                 if os.path.exists(path):
                     self._validate_java_path(path, desc)
 
+    def _check_toolchains(self) -> None:
+        """检测SDKMAN、jenv、asdf、mise、Gradle和Maven toolchains管理的JDK"""
+        self.log("\n扫描JDK管理器...")
+        for path, manager, source, owned in JavaToolchainDetector().discover(self._user_homes()):
+            self._validate_java_path(path, source)
+            install = self.java_installations.find(os.path.realpath(path))
+            if install is None:
+                continue
+            if os.path.islink(path):
+                self.manager_links.add(path)
+            if owned and not install['manager']:
+                install['manager'] = sys.intern(manager)
+
+    def _check_scanned_java_homes(self) -> None:
+        """检查目录遍历中发现的Java安装；应用程序自带的运行时不在卸载范围内"""
+        self.log("\n扫描目录中的Java安装...")
+        for path in self._scan_hits('java-home'):
+            if self._bundled_runtime(path):
+                self.log(f"跳过应用程序自带的Java运行时: {path}")
+                continue
+            self._validate_java_path(path, '目录扫描')
+
+    def _bundled_runtime(self, path: str) -> bool:
+        """path是否是嵌套在应用程序目录中的运行时(如IDE的jbr、Eclipse插件中的jre)
+
+        从path向上检查到遍历起始目录为止，删除这类运行时会使所属的应用无法启动。
+        """
+        if os.path.basename(path) == 'jbr':
+            # JetBrains Runtime只随IDE分发
+            return True
+        roots = {os.path.normpath(root) for root in SCAN_ROOTS}
+        parent = os.path.dirname(os.path.normpath(path))
+        while parent not in roots and parent != os.path.dirname(parent):
+            if os.path.basename(parent) == 'plugins':
+                return True
+            if any(os.path.exists(os.path.join(parent, marker)) for marker in self.APP_MARKERS):
+                return True
+            parent = os.path.dirname(parent)
+        return False
+
+    def register_detectors(self, engine: ScanEngine) -> None:
+        """注册Java安装目录匹配器"""
+        engine.register('java-home', self._match_java_home)
+
+    def _match_java_home(self, root: str, dirs: list, files: list) -> List[str]:
+        """在单个目录中查找Java安装候选路径(由遍历线程调用)"""
+        # JDK/JRE根目录都带有release文件和bin目录
+        if any(entry.name == 'release' for entry in files) and any(entry.name == 'bin' for entry in dirs):
+            # Java安装内部不会再嵌套其他安装，无需继续深入
+            dirs.clear()
+            return [root]
+        return []
+
     def _validate_java_path(self, path: str, source: str) -> None:
         """验证是否为有效的Java安装"""
+        # 统一以真实路径登记，default-java等符号链接记为别名
+        alias = path
+        path = os.path.realpath(path)
+        existing = self.java_installations.find(path)
+        if existing is not None:
+            self.java_installations.add_alias(existing, alias)
+            return
+
         # 如果是目录
         if os.path.isdir(path):
             java_bin = os.path.join(path, 'bin', 'java')
             if os.path.exists(java_bin):
-                version = self._get_java_version(java_bin)
+                # 优先读取release文件等元数据，没有元数据时才启动JVM
+                meta = self._read_java_metadata(path)
+                version = meta.get('version') or PROBE_PENDING
+                vendor = meta.get('vendor', '')
+                arch = meta.get('arch') or self._elf_arch(java_bin)
                 install_type = "JDK" if os.path.exists(os.path.join(path, 'bin', 'javac')) else "JRE"
-                
-                if not any(install['path'] == path for install in self.java_installations):
-                    self.java_installations.append({
-                        'path': path,
-                        'version': version,
-                        'source': source,
-                        'type': install_type
-                    })
-                    self.log(f"发现: {install_type} {version} @ {path} ({source})")
+                install = Installation(
+                    path=path,
+                    version=version,
+                    source=source,
+                    type=install_type,
+                    executable=java_bin,
+                    vendor=vendor,
+                    arch=arch,
+                    package=self._package_owner(path)
+                )
+
+                if version == PROBE_PENDING:
+                    self.probes.submit(
+                        install, 'version',
+                        lambda: self._memo('java-version', java_bin, self._get_java_version)
+                    )
+                self.java_installations.add(install, alias)
+                details = ", ".join(item for item in (vendor, arch) if item)
+                self.log(f"发现: {install_type} {version}{f' ({details})' if details else ''} @ {path} ({source})")
+
+    def _read_java_metadata(self, path: str) -> Dict[str, str]:
+        """从release文件(或旧版JRE的rt.jar清单)读取版本、厂商和架构"""
+        release = {}
+        try:
+            with open(os.path.join(path, 'release'), 'r', errors='replace') as f:
+                for line in f:
+                    key, sep, value = line.partition('=')
+                    if sep:
+                        release[key.strip()] = value.strip().strip('"')
+        except OSError:
+            pass
+
+        if release.get('JAVA_VERSION'):
+            return {
+                'version': release['JAVA_VERSION'],
+                'vendor': release.get('IMPLEMENTOR', ''),
+                'arch': release.get('OS_ARCH', '')
+            }
+
+        # Java 8及更早版本没有release文件时，rt.jar的清单中记录了版本和厂商
+        for rt_jar in (os.path.join(path, 'lib', 'rt.jar'), os.path.join(path, 'jre', 'lib', 'rt.jar')):
+            manifest = self._read_jar_manifest(rt_jar)
+            if manifest.get('Implementation-Version'):
+                return {
+                    'version': manifest['Implementation-Version'],
+                    'vendor': manifest.get('Implementation-Vendor', '')
+                }
+        return {}
+
+    def _read_jar_manifest(self, jar_path: str) -> Dict[str, str]:
+        """只读取jar中的META-INF/MANIFEST.MF，不解压其他内容"""
+        manifest = {}
+        try:
+            with zipfile.ZipFile(jar_path) as jar:
+                text = jar.read('META-INF/MANIFEST.MF').decode('utf-8', errors='replace')
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return manifest
+        # 以空格开头的行是上一行的续行
+        for line in text.replace('\r\n ', '').replace('\n ', '').splitlines():
+            key, sep, value = line.partition(':')
+            if sep:
+                manifest[key.strip()] = value.strip()
+        return manifest
+
+    def _elf_arch(self, binary: str) -> str:
+        """从ELF头的e_machine字段判断架构"""
+        machines = {3: 'x86', 40: 'arm', 62: 'x86_64', 183: 'aarch64', 21: 'ppc64', 22: 's390x', 243: 'riscv64'}
+        try:
+            with open(binary, 'rb') as f:
+                header = f.read(20)
+        except OSError:
+            return ''
+        if len(header) < 20 or header[:4] != b'\x7fELF':
+            return ''
+        byteorder = 'little' if header[5] == 1 else 'big'
+        return machines.get(int.from_bytes(header[18:20], byteorder), '')
 
     def _get_java_version(self, java_path: str) -> str:
-        """获取Java版本"""
+        """启动JVM获取Java版本(仅在没有元数据时使用)；失败时抛出ProbeError，结果不会被缓存"""
         try:
             result = subprocess.run(
                 [java_path, '-version'],
                 capture_output=True,
                 text=True,
-                timeout=5
+                timeout=PROBE_TIMEOUT
             )
             version_line = result.stderr.splitlines()[0]
-            match = re.search(r'["\']?(\d+(?:\.\d+)+)[_"\']?', version_line)
-            return match.group(1) if match else "未知版本"
         except Exception as e:
             self.log(f"获取版本失败 {java_path}: {str(e)}")
-            return "未知版本"
+            raise ProbeError("未知版本")
+        match = re.search(r'["\']?(\d+(?:\.\d+)+)[_"\']?', version_line)
+        if not match:
+            raise ProbeError("未知版本")
+        return match.group(1)
 
     def _check_alternatives(self) -> None:
         """检查alternatives系统中的Java"""
         self.log("\n检查alternatives系统中的Java...")
-        try:
-            result = subprocess.run(
-                ['update-alternatives', '--list', 'java'],
-                capture_output=True,
-                text=True
-            )
-            for path in result.stdout.splitlines():
-                if path:
-                    java_dir = os.path.dirname(os.path.dirname(path))
-                    self._validate_java_path(java_dir, 'alternatives系统')
-        except Exception as e:
-            self.log(f"检查alternatives失败: {str(e)}")
+        db = self._alternatives_db()
+        # 只装JDK不装JRE的发行版可能只注册了javac
+        for path in {*db.choices('java'), *db.choices('javac')}:
+            java_dir = os.path.dirname(os.path.dirname(path))
+            self._validate_java_path(java_dir, 'alternatives系统')
 
     def _check_environment_paths(self) -> None:
         """检查环境变量中的Java"""
@@ -340,6 +3660,13 @@ class JavaUninstaller(SystemCleaner):
                     java_dir = os.path.dirname(os.path.dirname(java_bin))
                     self._validate_java_path(java_dir, 'PATH环境变量')
 
+    def planned_removals(self) -> list:
+        """将被删除的安装(属于软件包的JDK交给包管理器，不在计划内)"""
+        if self._package_index().available:
+            return [install for install in self.java_installations if not install['package']]
+        # 没有包数据库时按安装位置推断
+        return [install for install in self.java_installations if install['source'] != '系统Java']
+
     def uninstall_java(self) -> None:
         """卸载所有检测到的Java安装"""
         if not self.java_installations:
@@ -349,107 +3676,47 @@ class JavaUninstaller(SystemCleaner):
         self.log("\n=== 开始卸载Java ===")
         self._remove_java_files()
         self._clean_environment()
-        self._remove_alternatives()
+        self.log("\n从alternatives系统中移除Java...")
+        self._remove_alternatives(self.cleanup)
         self.log("\n=== Java卸载完成 ===")
 
     def _remove_java_files(self) -> None:
         """删除Java安装文件"""
         self.log("\n删除Java安装文件...")
+        planned = self.planned_removals()
+        planned_ids = {id(install) for install in planned}
         for install in self.java_installations:
-            path = install['path']
-            
-            # 如果是系统Java，提示不要删除
-            if install['source'] == '系统Java':
-                self.log(f"警告: 跳过系统Java {path} - 请使用系统包管理器卸载")
+            # 系统Java交给包管理器，提示对应的软件包
+            if id(install) not in planned_ids:
+                self.log(f"警告: 跳过系统Java {install['path']} - {self._package_advice(install)}")
+        self.removed = self._remove_paths(planned)
+
+        # 管理器中的链接只在目标已被删除时清理，仍指向现存JDK的共享链接保留
+        for link in sorted(self.manager_links):
+            if not os.path.islink(link):
+                continue
+            if os.path.exists(link):
+                self.log(f"跳过共享符号链接: {link} -> {os.path.realpath(link)}")
                 continue
-            
             try:
-                if os.path.exists(path):
-                    shutil.rmtree(path)
-                    self.log(f"已删除: {path}")
+                os.unlink(link)
+                self.log(f"已删除悬空链接: {link}")
             except Exception as e:
-                self.log(f"删除失败 {path}: {str(e)}")
+                self.log(f"删除链接失败 {link}: {str(e)}")
 
     def _clean_environment(self) -> None:
-        """清理Java环境变量"""
+        """清理Java环境变量(只针对实际删除的安装，被保留的安装的配置不受影响)"""
         self.log("\n清理Java环境变量...")
-        env_files = [
-            os.path.expanduser('~/.bashrc'),
-            os.path.expanduser('~/.bash_profile'),
-            os.path.expanduser('~/.zshrc'),
-            os.path.expanduser('~/.profile'),
-            '/etc/environment'
-        ]
-
-        for env_file in env_files:
-            if os.path.exists(env_file):
-                try:
-                    # 备份原文件
-                    shutil.copy2(env_file, env_file + '.bak')
-                    
-                    # 读取内容并过滤Java相关环境变量
-                    with open(env_file, 'r') as f:
-                        lines = f.readlines()
-                    
-                    new_lines = []
-                    for line in lines:
-                        if not any(keyword in line.lower() for keyword in ['java', 'jdk', 'jre']):
-                            new_lines.append(line)
-                    
-                    # 写入新内容
-                    with open(env_file, 'w') as f:
-                        f.writelines(new_lines)
-                    
-                    self.log(f"已清理环境文件: {env_file}")
-                except Exception as e:
-                    self.log(f"清理环境文件失败 {env_file}: {str(e)}")
-
-    def _remove_alternatives(self) -> None:
-        """从alternatives系统中移除Java"""
-        self.log("\n从alternatives系统中移除Java...")
-        try:
-            # 获取所有Java相关的alternatives
-            result = subprocess.run(
-                ['update-alternatives', '--list', 'java'],
-                capture_output=True,
-                text=True
-            )
-            
-            for java_path in result.stdout.splitlines():
-                if java_path:
-                    # 从alternatives中移除
-                    subprocess.run(
-                        ['update-alternatives', '--remove', 'java', java_path],
-                        check=True
-                    )
-                    self.log(f"已从alternatives中移除: {java_path}")
-        except Exception as e:
-            self.log(f"更新alternatives失败: {str(e)}")
+        self._rewrite_env_files(self.cleanup)
 
     def verify_uninstall(self) -> bool:
-        """验证卸载是否成功"""
+        """验证卸载是否成功：对照删除计划复查，不重新检测"""
         self.log("\n=== 验证Java卸载结果 ===")
-        remaining = []
-        original_installations = self.java_installations.copy()
-        self.java_installations = []
-        self.find_java_installations()
-        remaining = self.java_installations
-        
-        if not remaining:
-            self.log("所有Java安装已成功移除")
-            return True
-        
-        self.log("以下Java安装未被完全移除:")
-        for install in remaining:
-            self.log(f"- {install['type']} {install['version']} @ {install['path']}")
-        
-        # 恢复原始安装列表
-        self.java_installations = original_installations
-        return False
+        return self._verify_planned('Java')
 
-def main_menu():
+def main_menu(options: Optional[argparse.Namespace] = None):
     """主菜单界面"""
-    cleaner = SystemCleaner()
+    cleaner = SystemCleaner(options)
     
     while True:
         cleaner.clear_screen()
@@ -458,27 +3725,51 @@ def main_menu():
         print("\n请选择要卸载的环境:")
         print("1. Python")
         print("2. Java")
-        print("3. 退出")
+        print("3. Python和Java(一次扫描)")
+        print("4. 退出")
         
-        choice = input("\n请输入选项(1-3): ")
+        choice = input("\n请输入选项(1-4): ")
         
         if choice == '1':
-            handle_python_uninstall()
+            handle_python_uninstall(options)
         elif choice == '2':
-            handle_java_uninstall()
+            handle_java_uninstall(options)
         elif choice == '3':
+            handle_full_uninstall(options)
+        elif choice == '4':
             print("\n感谢使用，再见！")
             sys.exit(0)
         else:
             print("\n无效的输入，请重新选择")
             input("按Enter键继续...")
 
-def handle_python_uninstall():
+def print_plan(cleaner: SystemCleaner, groups: List[Tuple[str, list, list]]) -> None:
+    """列出各组安装及计划删除项的可释放空间
+
+    groups为[(名称, 全部安装, 计划删除的安装)]；所有组一起统计，组间共享的硬链接也只计一次。
+    """
+    planned = [install for _, _, group in groups for install in group]
+    reclaimable, apparent = cleaner.measure_plan(planned)
+    planned_ids = {id(install) for install in planned}
+    for title, installations, _ in groups:
+        if not installations:
+            continue
+        print(f"\n发现以下{title}安装:")
+        for i, install in enumerate(installations, 1):
+            if id(install) in planned_ids:
+                size = cleaner.format_size(install['size'])
+            else:
+                size = f"跳过，属于软件包 {install['package']}" if install['package'] else "跳过"
+            print(f"{i}. {install['type']} {install['version']} @ {install['path']} ({install['source']}) [{size}]")
+    print(f"\n预计可释放: {cleaner.format_size(reclaimable)} (按文件逐个累加为 {cleaner.format_size(apparent)}，"
+          f"硬链接只计一次，仍被计划外文件引用的部分不计入)")
+
+def handle_python_uninstall(options: Optional[argparse.Namespace] = None):
     """处理Python卸载流程"""
-    cleaner = SystemCleaner()
+    cleaner = SystemCleaner(options)
     cleaner.clear_screen()
     print("\n=== Python卸载 ===")
-    uninstaller = PythonUninstaller()
+    uninstaller = PythonUninstaller(options)
     
     if not uninstaller.is_root:
         uninstaller._ensure_root()
@@ -491,9 +3782,11 @@ def handle_python_uninstall():
         input("\n按Enter键返回主菜单...")
         return
     
-    print("\n发现以下Python安装:")
-    for i, install in enumerate(installations, 1):
-        print(f"{i}. {install['type']} {install['version']} @ {install['path']} ({install['source']})")
+    print_plan(uninstaller, [('Python', installations, uninstaller.planned_removals())])
+    if uninstaller.options.dry_run:
+        print("\n--dry-run: 未删除任何文件")
+        input("\n按Enter键返回主菜单...")
+        return
     
     confirm = input("\n确定要卸载所有以上Python安装吗？(y/n): ")
     if confirm.lower() != 'y':
@@ -511,12 +3804,12 @@ def handle_python_uninstall():
     
     input("\n按Enter键返回主菜单...")
 
-def handle_java_uninstall():
+def handle_java_uninstall(options: Optional[argparse.Namespace] = None):
     """处理Java卸载流程"""
-    cleaner = SystemCleaner()
+    cleaner = SystemCleaner(options)
     cleaner.clear_screen()
     print("\n=== Java卸载 ===")
-    uninstaller = JavaUninstaller()
+    uninstaller = JavaUninstaller(options)
     
     if not uninstaller.is_root:
         uninstaller._ensure_root()
@@ -529,9 +3822,11 @@ def handle_java_uninstall():
         input("\n按Enter键返回主菜单...")
         return
     
-    print("\n发现以下Java安装:")
-    for i, install in enumerate(installations, 1):
-        print(f"{i}. {install['type']} {install['version']} @ {install['path']} ({install['source']})")
+    print_plan(uninstaller, [('Java', installations, uninstaller.planned_removals())])
+    if uninstaller.options.dry_run:
+        print("\n--dry-run: 未删除任何文件")
+        input("\n按Enter键返回主菜单...")
+        return
     
     confirm = input("\n确定要卸载所有以上Java安装吗？(y/n): ")
     if confirm.lower() != 'y':
@@ -549,5 +3844,158 @@ def handle_java_uninstall():
     
     input("\n按Enter键返回主菜单...")
 
+def handle_full_uninstall(options: Optional[argparse.Namespace] = None):
+    """处理Python和Java的完整卸载流程(共用一次目录遍历)"""
+    cleaner = SystemCleaner(options)
+    cleaner.clear_screen()
+    print("\n=== Python和Java卸载 ===")
+    python_uninstaller = PythonUninstaller(options)
+    java_uninstaller = JavaUninstaller(options)
+    
+    if not python_uninstaller.is_root:
+        python_uninstaller._ensure_root()
+        return
+    
+    # 两个卸载器的检测器注册到同一个引擎，只遍历一次文件系统
+    python_uninstaller._open_index()
+    engine = ScanEngine(python_uninstaller.options, python_uninstaller.index)
+    python_uninstaller.register_detectors(engine)
+    java_uninstaller.register_detectors(engine)
+    scan_hits = engine.run(SCAN_ROOTS)
+    python_uninstaller._report_scan(engine)
+    python_uninstaller.scan_hits = scan_hits
+    java_uninstaller.scan_hits = scan_hits
+    # 两张路径模式表也编译进同一棵前缀树，共享的目录层级只列出一次
+    glob_hits = PatternTrie(
+        [pattern for pattern, _ in python_uninstaller.patterns] +
+        [pattern for pattern, _ in java_uninstaller.java_patterns]
+    ).expand()
+    python_uninstaller.glob_hits = glob_hits
+    java_uninstaller.glob_hits = glob_hits
+    
+    python_installations = python_uninstaller.detect_installations()
+    java_installations = java_uninstaller.find_java_installations()
+    
+    if not python_installations and not java_installations:
+        print("\n未找到任何Python或Java安装")
+        input("\n按Enter键返回主菜单...")
+        return
+    
+    print_plan(python_uninstaller, [
+        ('Python', python_installations, python_uninstaller.planned_removals()),
+        ('Java', java_installations, java_uninstaller.planned_removals())
+    ])
+    if python_uninstaller.options.dry_run:
+        print("\n--dry-run: 未删除任何文件")
+        input("\n按Enter键返回主菜单...")
+        return
+    
+    confirm = input("\n确定要卸载所有以上Python和Java安装吗？(y/n): ")
+    if confirm.lower() != 'y':
+        print("\n操作已取消")
+        input("\n按Enter键返回主菜单...")
+        return
+    
+    python_uninstaller.uninstall()
+    java_uninstaller.uninstall_java()
+    
+    python_ok = python_uninstaller.verify_uninstall()
+    java_ok = java_uninstaller.verify_uninstall()
+    if not (python_ok and java_ok):
+        print("\n警告: 部分安装可能未被完全移除")
+        print("建议: 手动检查上述残留并重启终端")
+    else:
+        print("\n所有Python和Java安装已成功移除")
+    
+    input("\n按Enter键返回主菜单...")
+
+def purge_trash(options: Optional[argparse.Namespace] = None):
+    """purge命令：以最低优先级清空回收目录"""
+    cleaner = SystemCleaner(options)
+    TrashStore.lower_priority()
+    engine = RemovalEngine(cleaner.options.rm_workers)
+    expired = cleaner._expire_quarantine(QuarantineStore(cleaner.options.retention_days), engine)
+    if expired:
+        # 隔离时保留的环境变量和alternatives条目，在条目删除后清理
+        cleaner._rewrite_env_files(expired)
+        cleaner._remove_alternatives(expired)
+    reports = TrashStore().purge(engine)
+    if not reports:
+        cleaner.log("回收目录为空")
+        return
+    files = sum(report['files'] for report in reports.values())
+    dirs = sum(report['dirs'] for report in reports.values())
+    cleaner.log(f"已清理回收目录: {len(reports)} 项, {files} 个文件, {dirs} 个目录")
+    for path, report in reports.items():
+        for failed, reason in report['failures']:
+            cleaner.log(f"清理失败 {failed}: {reason}")
+
+def restore_quarantined(options: Optional[argparse.Namespace] = None):
+    """restore命令：不带参数时列出隔离区条目，否则按条目id或原路径恢复"""
+    cleaner = SystemCleaner(options)
+    store = QuarantineStore(cleaner.options.retention_days)
+    if not cleaner.options.target:
+        entries = store.entries()
+        if not entries:
+            cleaner.log("隔离区为空")
+        for manifest in entries:
+            stamp = time.strftime('%Y-%m-%d %H:%M', time.localtime(manifest['time']))
+            cleaner.log(f"{manifest['id']}  {stamp}  {manifest['type']} {manifest['version']} @ {manifest['original']}")
+        return
+
+    manifest, message = store.restore(cleaner.options.target, RemovalEngine(cleaner.options.rm_workers))
+    cleaner.log(f"{message}: {manifest['original']}" if manifest else message)
+
+def build_parser() -> argparse.ArgumentParser:
+    """命令行参数"""
+    parser = argparse.ArgumentParser(description="开发环境完全卸载工具")
+    parser.add_argument('command', nargs='?', choices=['purge', 'restore'], default=None,
+                        help="purge: 清空延迟删除的回收目录; restore: 从隔离区恢复安装")
+    parser.add_argument('target', nargs='?', default=None,
+                        help="restore要恢复的隔离区条目id或原路径(省略时列出所有条目)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="扫描线程数(默认按CPU数自动选择)")
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help="虚拟环境扫描的最大目录深度")
+    parser.add_argument('--one-filesystem', action='store_true',
+                        help="扫描时不跨越文件系统(按st_dev判断)")
+    parser.add_argument('--prune-report', default=None,
+                        help="将扫描时跳过的子树明细写入该文件")
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH,
+                        help="持久化扫描索引文件(SQLite)")
+    parser.add_argument('--no-index', action='store_true',
+                        help="不使用扫描索引，每次完整扫描")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="清空扫描索引并强制完整重新扫描")
+    parser.add_argument('--probe-workers', type=int, default=None,
+                        help="同时启动进程探测版本的最大数量(默认不超过4)")
+    parser.add_argument('--probe-deadline', type=float, default=PROBE_DEADLINE,
+                        help="所有版本探测的总时限(秒)")
+    parser.add_argument('--rm-workers', type=int, default=None,
+                        help="删除线程数(默认按CPU数自动选择)")
+    parser.add_argument('--defer', action='store_true',
+                        help="先把安装移入回收目录，由后台低优先级进程删除")
+    parser.add_argument('--quarantine', action='store_true',
+                        help="把安装移入隔离区而不是删除，可以用restore命令恢复")
+    parser.add_argument('--retention-days', type=float, default=QUARANTINE_RETENTION_DAYS,
+                        help="隔离区条目的保留天数，过期后自动删除")
+    parser.add_argument('--archive', default=None, metavar='DIR',
+                        help="删除前把每个安装压缩归档到该目录")
+    parser.add_argument('--archive-format', choices=sorted(BlockArchiver.SUFFIXES), default='xz',
+                        help="归档格式(默认xz)")
+    parser.add_argument('--archive-workers', type=int, default=None,
+                        help="同时压缩的安装数(默认按CPU数)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="只列出删除计划和可释放空间，不做任何修改")
+    parser.add_argument('--mem-stats', action='store_true',
+                        help="检测结束后输出安装记录的内存占用")
+    return parser
+
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    cli_options = build_parser().parse_args()
+    if cli_options.command == 'purge':
+        purge_trash(cli_options)
+    elif cli_options.command == 'restore':
+        restore_quarantined(cli_options)
+    else:
+        main_menu(cli_options)
\ No newline at end of file
@@ -12,15 +12,22 @@
 import os
 import re
 import shutil
+import stat
 import subprocess
 import sys
 import glob
+import argparse
+import threading
+from collections import deque
 import plistlib
-from typing import List, Dict, Union, Tuple
+from typing import List, Dict, Union, Tuple, Optional, Callable
 
 class SystemCleaner:
-    def __init__(self):
+    def __init__(self, options: Optional[argparse.Namespace] = None):
         self.verbose = True
+        self.options = options if options is not None else build_parser().parse_args([])
+        # 验证后仍然存在的路径[{path, owner, state}]
+        self.remaining = []
         self.is_admin = self._check_admin()
     
     def log(self, message: str) -> None:
@@ -36,6 +43,49 @@ class SystemCleaner:
         """检查是否以管理员身份运行"""
         return os.getuid() == 0
     
+    def _verify_removed(self, installs: list) -> List[Dict[str, str]]:
+        """只检查计划删除的路径及其别名(每个路径一次lstat)，返回仍然存在的项"""
+        remaining = []
+        for install in installs:
+            for path in (install['path'], *install.get('aliases', ())):
+                try:
+                    st = os.lstat(path)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    remaining.append({'path': path, 'owner': install['path'], 'state': f"无法访问({e.strerror})"})
+                    continue
+                if stat.S_ISLNK(st.st_mode):
+                    state = '符号链接' if os.path.exists(path) else '悬空链接'
+                elif stat.S_ISDIR(st.st_mode):
+                    state = '目录'
+                else:
+                    state = '文件'
+                remaining.append({'path': path, 'owner': install['path'], 'state': state})
+        return remaining
+
+    def _report_remaining(self) -> None:
+        """输出验证后仍然存在的路径"""
+        for item in self.remaining:
+            owner = f" (属于 {item['owner']})" if item['owner'] != item['path'] else ''
+            self.log(f"- {item['state']} @ {item['path']}{owner}")
+
+    def _report_pruned(self, rules: 'PruneRules') -> None:
+        """输出遍历时被裁剪的子树，便于调整裁剪规则"""
+        if not rules.skipped:
+            return
+        summary = ", ".join(f"{reason} {count}" for reason, count in sorted(rules.summary().items()))
+        self.log(f"已跳过 {len(rules.skipped)} 个子树: {summary}")
+        report_file = self.options.prune_report
+        if report_file:
+            try:
+                with open(report_file, 'w') as f:
+                    for path, reason in sorted(rules.skipped):
+                        f.write(f"{reason}\t{path}\n")
+                self.log(f"跳过明细已写入: {report_file}")
+            except Exception as e:
+                self.log(f"写入跳过明细失败 {report_file}: {str(e)}")
+
     def _ensure_admin(self) -> None:
         """确保以管理员身份运行"""
         if not self.is_admin:
@@ -43,9 +93,179 @@ class SystemCleaner:
             self.log("请在终端中执行: sudo python3 " + " ".join(sys.argv))
             sys.exit(1)
 
+class PruneRules:
+    """目录遍历裁剪规则：目录名/路径黑名单、最大深度和单文件系统模式"""
+
+    # 不可能包含Python/Java安装的目录名
+    DEFAULT_NAMES = frozenset({
+        'node_modules', '.git', '.hg', '.svn', '__pycache__',
+        '.mypy_cache', '.pytest_cache', '.ruff_cache',
+        '.npm', '.yarn', '.cargo', '.rustup', '.Trash'
+    })
+    DEFAULT_PATHS = (
+        '/dev', '/Volumes', '/Network', '/System/Volumes', '/private/var/vm'
+    )
+
+    def __init__(self, max_depth: Optional[int] = None, one_filesystem: bool = False):
+        self.names = set(self.DEFAULT_NAMES)
+        self.paths = {path: '路径黑名单' for path in self.DEFAULT_PATHS}
+        self.max_depth = max_depth
+        self.one_filesystem = one_filesystem
+        self.skipped = []
+        self._lock = threading.Lock()
+
+    def check(self, entry: os.DirEntry, depth: int, root_dev: Optional[int]) -> Optional[str]:
+        """判断是否跳过该子目录，返回跳过原因，None表示继续遍历"""
+        if entry.name in self.names:
+            return '目录名黑名单'
+        reason = self.paths.get(entry.path)
+        if reason:
+            return reason
+        if self.max_depth is not None and depth > self.max_depth:
+            return '超过最大深度'
+        if self.one_filesystem and root_dev is not None:
+            try:
+                if entry.stat(follow_symlinks=False).st_dev != root_dev:
+                    return '跨文件系统'
+            except OSError:
+                return '无法访问'
+        return None
+
+    def skip(self, path: str, reason: str) -> None:
+        """记录被跳过的子树"""
+        with self._lock:
+            self.skipped.append((path, reason))
+
+    def summary(self) -> Dict[str, int]:
+        """按原因统计被跳过的子树数量"""
+        counts = {}
+        for _, reason in self.skipped:
+            counts[reason] = counts.get(reason, 0) + 1
+        return counts
+
+class ParallelWalker:
+    """基于os.scandir的多线程目录遍历器(work-stealing)"""
+
+    def __init__(self, workers: Optional[int] = None, rules: Optional[PruneRules] = None):
+        # 与ThreadPoolExecutor的默认线程数保持一致
+        self.workers = max(1, workers or min(32, (os.cpu_count() or 1) + 4))
+        self.rules = rules
+
+    def walk(self, roots: List[str], visit: Callable[[str, list, list], Optional[list]]) -> list:
+        """并行遍历roots下所有目录
+
+        每个目录调用一次visit(root, dirs, files)，dirs和files为os.DirEntry列表。
+        与os.walk一样，visit可以原地修改dirs来跳过子目录；返回的元素会被汇总返回。
+        设置了rules时，被裁剪的子目录不会进入，并记录在rules.skipped中。
+        """
+        # 每个线程一个双端队列：自己从右端取(深度优先)，空闲时从其他线程左端窃取
+        queues = [deque() for _ in range(self.workers)]
+        results = [[] for _ in range(self.workers)]
+        errors = []
+        cond = threading.Condition()
+        pending = [len(roots)]
+
+        for i, root in enumerate(roots):
+            queues[i % self.workers].append((root, 0, self._root_dev(root)))
+
+        threads = [
+            threading.Thread(target=self._worker, args=(i, queues, results[i], errors, cond, pending, visit), daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        return [item for chunk in results for item in chunk]
+
+    def _worker(self, index: int, queues: list, sink: list, errors: list,
+                cond: threading.Condition, pending: list, visit: Callable) -> None:
+        """工作线程：处理自己的队列，队列为空时窃取其他线程的任务"""
+        own = queues[index]
+        while True:
+            item = self._take(index, queues)
+            if item is None:
+                with cond:
+                    if pending[0] == 0:
+                        return
+                    cond.wait(0.05)
+                continue
+
+            try:
+                subdirs = self._scan(item, visit, sink)
+                if subdirs:
+                    # 先计数再入队，避免其他线程误判遍历已结束
+                    with cond:
+                        pending[0] += len(subdirs)
+                        own.extend(subdirs)
+                        cond.notify(len(subdirs))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                with cond:
+                    pending[0] -= 1
+                    if pending[0] == 0:
+                        cond.notify_all()
+
+    def _take(self, index: int, queues: list) -> Optional[tuple]:
+        """从自己的队列取任务，失败则从其他队列窃取"""
+        try:
+            return queues[index].pop()
+        except IndexError:
+            pass
+        for offset in range(1, len(queues)):
+            try:
+                return queues[(index + offset) % len(queues)].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _root_dev(self, root: str) -> Optional[int]:
+        """单文件系统模式下记录起始目录所在的设备号"""
+        if not (self.rules and self.rules.one_filesystem):
+            return None
+        try:
+            return os.stat(root).st_dev
+        except OSError:
+            return None
+
+    def _scan(self, item: tuple, visit: Callable, sink: list) -> List[tuple]:
+        """列出单个目录并调用visit，返回需要继续遍历的子目录"""
+        path, depth, root_dev = item
+        dirs, files = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    # DirEntry自带类型信息，无需额外stat
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    (dirs if is_dir else files).append(entry)
+        except OSError:
+            return []
+
+        found = visit(path, dirs, files)
+        if found:
+            sink.extend(found)
+        # 与os.walk默认行为一致：不进入指向目录的符号链接
+        subdirs = []
+        for entry in dirs:
+            if entry.is_symlink():
+                continue
+            reason = self.rules.check(entry, depth + 1, root_dev) if self.rules else None
+            if reason:
+                self.rules.skip(entry.path, reason)
+            else:
+                subdirs.append((entry.path, depth + 1, root_dev))
+        return subdirs
+
 class PythonUninstaller(SystemCleaner):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, options: Optional[argparse.Namespace] = None):
+        super().__init__(options)
         self.installations = []
         # MacOS特有的Python安装路径模式
         self.patterns = [
@@ -181,14 +401,21 @@ class PythonUninstaller(SystemCleaner):
             '/opt/'
         ]
 
-        for search_path in search_paths:
-            for root, dirs, _ in os.walk(search_path):
-                if 'pyvenv.cfg' in dirs or 'bin/python' in dirs:
-                    self._validate_python_path(root, '虚拟环境')
-                # 检查常见虚拟环境目录名
-                for dir_name in dirs:
-                    if dir_name.lower() in ('venv', 'virtualenv', '.venv'):
-                        self._validate_python_path(os.path.join(root, dir_name), '虚拟环境')
+        rules = PruneRules(self.options.max_depth, self.options.one_filesystem)
+        walker = ParallelWalker(self.options.workers, rules)
+        for path in sorted(set(walker.walk(search_paths, self._match_virtualenv))):
+            self._validate_python_path(path, '虚拟环境')
+        self._report_pruned(rules)
+
+    def _match_virtualenv(self, root: str, dirs: list, files: list) -> List[str]:
+        """在单个目录中查找虚拟环境候选路径(由遍历线程调用)"""
+        # 标准虚拟环境的根目录含有pyvenv.cfg文件
+        if any(entry.name == 'pyvenv.cfg' for entry in files):
+            # 虚拟环境内部不会再嵌套虚拟环境，无需继续深入
+            dirs.clear()
+            return [root]
+        # 旧版virtualenv创建的环境没有pyvenv.cfg，按常见目录名识别，由_validate_python_path确认
+        return [entry.path for entry in dirs if entry.name.lower() in ('venv', 'virtualenv', '.venv')]
 
     def uninstall(self) -> None:
         """执行卸载操作"""
@@ -242,26 +469,20 @@ class PythonUninstaller(SystemCleaner):
                     self.log(f"清理 {shell_file} 失败: {str(e)}")
 
     def verify_uninstall(self) -> bool:
-        """验证卸载是否成功"""
+        """验证卸载是否成功：只复查计划删除的路径，不重新检测"""
         self.log("\n=== 验证Python卸载结果 ===")
-        original_installations = self.installations.copy()
-        self.installations = []
-        self.detect_installations()
-
-        if not self.installations:
+        self.remaining = self._verify_removed(self.installations)
+        if not self.remaining:
             self.log("所有Python安装已成功移除")
             return True
 
-        self.log("\n以下Python安装未被完全移除:")
-        for install in self.installations:
-            self.log(f"- {install['type']} {install['version']} @ {install['path']}")
-
-        self.installations = original_installations
+        self.log("\n以下Python安装路径未被完全移除:")
+        self._report_remaining()
         return False
 
 class JavaUninstaller(SystemCleaner):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, options: Optional[argparse.Namespace] = None):
+        super().__init__(options)
         self.java_installations = []
 
     def find_java_installations(self) -> List[Dict[str, str]]:
@@ -448,29 +669,20 @@ class JavaUninstaller(SystemCleaner):
                     self.log(f"清理 {shell_file} 失败: {str(e)}")
 
     def verify_uninstall(self) -> bool:
-        """验证卸载是否成功"""
+        """验证卸载是否成功：只复查计划删除的路径，不重新检测"""
         self.log("\n=== 验证Java卸载结果 ===")
-        remaining = []
-        original_installations = self.java_installations.copy()
-        self.java_installations = []
-        self.find_java_installations()
-        remaining = self.java_installations
-        
-        if not remaining:
+        self.remaining = self._verify_removed(self.java_installations)
+        if not self.remaining:
             self.log("所有Java安装已成功移除")
             return True
-        
-        self.log("以下Java安装未被完全移除:")
-        for install in remaining:
-            self.log(f"- {install['type']} {install['version']} @ {install['path']}")
-        
-        # 恢复原始安装列表
-        self.java_installations = original_installations
+
+        self.log("\n以下Java安装路径未被完全移除:")
+        self._report_remaining()
         return False
 
-def main_menu():
+def main_menu(options: Optional[argparse.Namespace] = None):
     """主菜单界面"""
-    cleaner = SystemCleaner()
+    cleaner = SystemCleaner(options)
     
     while True:
         cleaner.clear_screen()
@@ -484,9 +696,9 @@ def main_menu():
         choice = input("\n请输入选项(1-3): ")
         
         if choice == '1':
-            handle_python_uninstall()
+            handle_python_uninstall(options)
         elif choice == '2':
-            handle_java_uninstall()
+            handle_java_uninstall(options)
         elif choice == '3':
             print("\n感谢使用，再见！")
             sys.exit(0)
@@ -494,12 +706,12 @@ def main_menu():
             print("\n无效的输入，请重新选择")
             input("按Enter键继续...")
 
-def handle_python_uninstall():
+def handle_python_uninstall(options: Optional[argparse.Namespace] = None):
     """处理Python卸载流程"""
-    cleaner = SystemCleaner()
+    cleaner = SystemCleaner(options)
     cleaner.clear_screen()
     print("\n=== Python卸载 ===")
-    uninstaller = PythonUninstaller()
+    uninstaller = PythonUninstaller(options)
     
     if not uninstaller.is_admin:
         uninstaller._ensure_admin()
@@ -532,12 +744,12 @@ def handle_python_uninstall():
     
     input("\n按Enter键返回主菜单...")
 
-def handle_java_uninstall():
+def handle_java_uninstall(options: Optional[argparse.Namespace] = None):
     """处理Java卸载流程"""
-    cleaner = SystemCleaner()
+    cleaner = SystemCleaner(options)
     cleaner.clear_screen()
     print("\n=== Java卸载 ===")
-    uninstaller = JavaUninstaller()
+    uninstaller = JavaUninstaller(options)
     
     if not uninstaller.is_admin:
         uninstaller._ensure_admin()
@@ -570,5 +782,18 @@ def handle_java_uninstall():
     
     input("\n按Enter键返回主菜单...")
 
+def build_parser() -> argparse.ArgumentParser:
+    """命令行参数"""
+    parser = argparse.ArgumentParser(description="开发环境完全卸载工具")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="扫描线程数(默认按CPU数自动选择)")
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help="虚拟环境扫描的最大目录深度")
+    parser.add_argument('--one-filesystem', action='store_true',
+                        help="扫描时不跨越文件系统(按st_dev判断)")
+    parser.add_argument('--prune-report', default=None,
+                        help="将扫描时跳过的子树明细写入该文件")
+    return parser
+
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    main_menu(build_parser().parse_args())
\ No newline at end of file